@@ -0,0 +1,294 @@
+'''
+Multi-process actor-learner training.
+
+Each actor process drives its own simulator connection (a given port, or a
+local Simulator.SimulatorServer started inside the actor) with an
+epsilon-greedy policy read from the learner's SharedQTable, and streams its
+transitions through a single-producer/single-consumer ring in a shared
+mapped file. The learner drains all rings, applies them to the master
+Q-table with update_batch(), and republishes the table every
+publish_interval seconds:
+
+    ql = QLearningController(n_actions=5)
+    with ActorLearner(ql, n_actors=4) as trainer:
+        trainer.run(seconds=60)
+    ql.save_q_table()
+
+or from the shell: python ActorLearner.py --actors 4 --seconds 60
+'''
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import signal
+import tempfile
+import time
+
+import numpy as np
+
+from Connector import CoppeliaClient
+from Qlearning import QLearningController
+from SharedTable import SharedQTable
+from Simulator import SimulatorServer
+from StateEncoder import THREE_SENSOR_STATE_SPEC
+
+# One transition as stored in a ring slot (10 bytes)
+TRANSITION = np.dtype([("state", "<u2"), ("action", "u1"), ("done", "?"),
+                       ("reward", "<f4"), ("next_state", "<u2")])
+HEAD_OFFSET = 0         # transitions written so far (producer)
+TAIL_OFFSET = 64        # transitions consumed so far (consumer), own cache line
+DATA_OFFSET = 128
+
+
+class TransitionRing:
+    """
+    Fixed-size SPSC queue of transitions in a mapped file. The producer
+    only writes head, the consumer only writes tail, so neither needs a
+    lock. When the ring is full the producer drops the transition (and
+    counts it) rather than stall a robot.
+    """
+    def __init__(self, path, capacity=None):
+        if capacity is not None:
+            with open(path, "wb") as f:
+                f.truncate(DATA_OFFSET + capacity * TRANSITION.itemsize)
+        size = os.path.getsize(path)
+        self.path = path
+        self.capacity = (size - DATA_OFFSET) // TRANSITION.itemsize
+        self.map = np.memmap(path, dtype=np.uint8, mode="r+")
+        self.head = self.map[HEAD_OFFSET:HEAD_OFFSET + 8].view(np.uint64)
+        self.tail = self.map[TAIL_OFFSET:TAIL_OFFSET + 8].view(np.uint64)
+        self.slots = self.map[DATA_OFFSET:DATA_OFFSET + self.capacity * TRANSITION.itemsize] \
+            .view(TRANSITION)
+        self.dropped = 0
+
+    def push(self, state, action, reward, next_state, done=False):
+        head = int(self.head[0])
+        if head - int(self.tail[0]) >= self.capacity:
+            self.dropped += 1
+            return False
+        self.slots[head % self.capacity] = (state, action, done, reward, next_state)
+        self.head[0] = head + 1     # publish only after the slot is written
+        return True
+
+    def pop_all(self):
+        """
+        Copy out everything written since the last call.
+        """
+        head, tail = int(self.head[0]), int(self.tail[0])
+        if head == tail:
+            return self.slots[:0].copy()
+        batch = self.slots[np.arange(tail, head) % self.capacity]
+        self.tail[0] = head
+        return batch
+
+    def close(self):
+        self.head = self.tail = self.slots = None
+        self.map = None
+
+
+# =====================================================
+# Actor process
+# =====================================================
+def run_actor(index, port, ring_path, table_path, n_actions, state_spec, epsilon, seed, stop):
+    """
+    Drive one robot until stop is set, pushing (s, a, r, s') into the ring.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)   # the learner shuts actors down
+    server = None
+    if port is None:
+        server = SimulatorServer(port=0, speedup=0)
+        port = server.start_in_thread()
+
+    ql = QLearningController(n_actions=n_actions, state_spec=state_spec)
+    ring = TransitionRing(ring_path)
+    live = SharedQTable.attach(table_path)
+    rng = random.Random(seed)
+    client = CoppeliaClient(port=port)
+    client.connect()
+    client.preencode_motor_commands(ql.perform_action(a) for a in range(n_actions))
+
+    prev_state = prev_action = None
+    try:
+        while not stop.is_set():
+            sensor_data, _ = client.wait_for_latest_sensor_data()
+            if not sensor_data:
+                continue
+            state = ql.Get_state(sensor_data)
+            if prev_state is not None:
+                ring.push(prev_state, prev_action, ql.Calculate_reward(state), state)
+
+            if rng.random() < epsilon:
+                action = rng.randrange(n_actions)
+            else:
+                action = live.greedy_action(state)
+            ql.last_action = action
+            # force: with a local simulator every command is a step
+            client.send_motor_command(*ql.perform_action(action), force=True)
+            prev_state, prev_action = state, action
+    finally:
+        client.send_motor_command(0, 0, force=True)
+        client.close()
+        if server is not None:
+            server.shutdown()
+        if ring.dropped:
+            print(f"[Actor {index}] Dropped {ring.dropped} transitions (ring full)")
+        ring.close()
+        live.close()
+
+
+# =====================================================
+# Learner
+# =====================================================
+class ActorLearner:
+    def __init__(self, controller, n_actors=4, ports=None, epsilon=0.1,
+                 ring_capacity=1 << 16, publish_interval=0.05, replay=None, seed=None):
+        """
+        controller:       QLearningController (or subclass) holding the master table
+        ports:            simulator port per actor; None starts a local
+                          SimulatorServer inside every actor
+        epsilon:          exploration rate of the actors
+        publish_interval: seconds between Q-table publishes to the actors
+        replay:           optional Replay.ReplayBuffer that also receives
+                          every transition
+        """
+        if ports is not None and len(ports) != n_actors:
+            raise ValueError(f"{n_actors} actors need {n_actors} ports, got {len(ports)}")
+        self.controller = controller
+        self.n_actors = n_actors
+        self.ports = ports or [None] * n_actors
+        self.epsilon = epsilon
+        self.ring_capacity = ring_capacity
+        self.publish_interval = publish_interval
+        self.replay = replay
+        self.seed = seed
+        self.workdir = None
+        self.rings = []
+        self.actors = []
+        self.live = None
+        self.stop = None
+        self.transitions = 0
+        self.publishes = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        shm = "/dev/shm" if os.path.isdir("/dev/shm") else None
+        self.workdir = tempfile.mkdtemp(prefix="actor_learner_", dir=shm)
+        table_path = os.path.join(self.workdir, "q_table.live")
+        self.live = SharedQTable.create(table_path, self.controller.q_table.shape)
+        self.live.publish(self.controller.q_table)
+
+        ctx = multiprocessing.get_context()
+        self.stop = ctx.Event()
+        seeds = np.random.SeedSequence(self.seed).generate_state(self.n_actors)
+        for i, port in enumerate(self.ports):
+            ring_path = os.path.join(self.workdir, f"ring_{i}")
+            self.rings.append(TransitionRing(ring_path, self.ring_capacity))
+            actor = ctx.Process(
+                target=run_actor, name=f"actor-{i}", daemon=True,
+                args=(i, port, ring_path, table_path, self.controller.n_actions,
+                      self.controller.state_spec, self.epsilon, int(seeds[i]), self.stop))
+            actor.start()
+            self.actors.append(actor)
+        print(f"[Learner] Started {self.n_actors} actors")
+
+    def step(self):
+        """
+        Apply every transition the actors produced since the last call.
+        Returns how many there were.
+        """
+        batches = [batch for batch in (ring.pop_all() for ring in self.rings) if len(batch)]
+        if not batches:
+            return 0
+        batch = np.concatenate(batches) if len(batches) > 1 else batches[0]
+        self.controller.update_batch(batch["state"], batch["action"], batch["reward"],
+                                     batch["next_state"], batch["done"])
+        if self.replay is not None:
+            self.replay.add_batch(batch["state"], batch["action"], batch["reward"],
+                                  batch["next_state"], batch["done"])
+        self.transitions += len(batch)
+        return len(batch)
+
+    def run(self, seconds=None, should_stop=None):
+        """
+        Learn until seconds have passed or should_stop() returns True.
+        Returns transitions learned per second.
+        """
+        started = last_publish = time.monotonic()
+        learned = 0
+        while True:
+            now = time.monotonic()
+            if seconds is not None and now - started >= seconds:
+                break
+            if should_stop is not None and should_stop():
+                break
+            n = self.step()
+            learned += n
+            if now - last_publish >= self.publish_interval:
+                self.live.publish(self.controller.q_table)
+                self.publishes += 1
+                last_publish = now
+            if not n:
+                time.sleep(0.001)
+            if not any(actor.is_alive() for actor in self.actors):
+                print("[Learner] All actors exited")
+                break
+        self.live.publish(self.controller.q_table)
+        return learned / max(time.monotonic() - started, 1e-9)
+
+    def close(self):
+        if self.stop is None:
+            return
+        self.stop.set()
+        for actor in self.actors:
+            actor.join(timeout=2.0)
+            if actor.is_alive():
+                actor.terminate()
+        self.step()     # whatever was produced before the actors stopped
+        for ring in self.rings:
+            ring.close()
+        self.live.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+        self.stop = None
+        self.actors, self.rings = [], []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Actor-learner Q-learning over several simulators")
+    parser.add_argument("--actors", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--ports", type=int, nargs="*",
+                        help="simulator port per actor; default starts a local simulator per actor")
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--epsilon", type=float, default=0.1)
+    parser.add_argument("--actions", type=int, default=5)
+    args = parser.parse_args()
+
+    # Same checkpoint and state layout as Train.py
+    ql = QLearningController(n_actions=args.actions, state_spec=THREE_SENSOR_STATE_SPEC)
+    try:
+        ql.load_q_table()
+    except ValueError as e:
+        print(f"[Learner] Cannot resume from {ql.filename}: {e}")
+        print("[Learner] Move it away to start a fresh Q-table. Exiting.")
+        return
+    trainer = ActorLearner(ql, n_actors=args.actors, ports=args.ports, epsilon=args.epsilon)
+    trainer.start()
+    try:
+        rate = trainer.run(seconds=args.seconds)
+        print(f"[Learner] {trainer.transitions} transitions, {rate:.0f}/s")
+    except KeyboardInterrupt:
+        print("\n[Learner] Interrupted")
+    finally:
+        trainer.close()
+        ql.save_q_table()
+        print(f"[Learner] Q-table saved to {ql.filename}")
+
+
+if __name__ == "__main__":
+    main()
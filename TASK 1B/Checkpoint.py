@@ -0,0 +1,330 @@
+import atexit
+import io
+import json
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+
+# =====================================================
+# Q-table checkpoint file format
+# =====================================================
+# One file per checkpoint, replaced atomically (temp file + fsync + rename),
+# so a crash mid-save leaves the previous checkpoint intact:
+#
+#     offset 0   fixed header, struct HEADER:
+#                  magic, schema version, metadata length, metadata CRC32,
+#                  data CRC32 (over everything after the metadata)
+#     offset 24  metadata, UTF-8 JSON: the scalar checkpoint fields
+#                (epsilon, n_states, n_actions, ...) and, under "arrays",
+#                the offset, dtype and shape of every array
+#     aligned    one block per array, each a complete .npy file (header +
+#                raw C-order data) starting on a 64-byte boundary
+#
+# Readers map the file once and hand out array views into the mapping, so
+# loading copies nothing. Nested dicts (e.g. the exploration state) are
+# stored with dotted keys and rebuilt on load. Windows cannot replace a
+# file that another process has mapped, so there readers always copy and a
+# running trainer can keep saving while a test process holds a checkpoint.
+
+MAGIC = b"EYQTABLE"
+SCHEMA_VERSION = 1
+HEADER = "<8sIIII"
+ALIGN = 64
+SUFFIX = ".ckpt"
+LEGACY_SUFFIX = ".pkl"
+MAP_REPLACEABLE = os.name != "nt"    # whether a mapped file can still be replaced
+
+
+def checkpoint_path(filename):
+    """
+    Checkpoint file for a filename; legacy .pkl names map to .ckpt.
+    """
+    root, ext = os.path.splitext(filename)
+    return root + SUFFIX if ext == LEGACY_SUFFIX else filename
+
+
+def _aligned(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _flatten(data, prefix=""):
+    """
+    Split a (nested) checkpoint dict into JSON fields and arrays, both keyed
+    by dotted path.
+    """
+    fields, arrays = {}, {}
+    for key, value in data.items():
+        name = prefix + key
+        if isinstance(value, dict):
+            sub_fields, sub_arrays = _flatten(value, name + ".")
+            fields.update(sub_fields)
+            arrays.update(sub_arrays)
+            fields.setdefault(name, {})
+        elif isinstance(value, np.ndarray):
+            arrays[name] = np.ascontiguousarray(value)
+        elif isinstance(value, np.generic):
+            fields[name] = value.item()
+        else:
+            fields[name] = value
+    return fields, arrays
+
+
+def _unflatten(flat):
+    data = {}
+    for name in sorted(flat, key=lambda n: n.count(".")):
+        *parents, key = name.split(".")
+        node = data
+        for parent in parents:
+            node = node[parent]
+        value = flat[name]
+        node[key] = {} if isinstance(value, dict) else value
+    return data
+
+
+def _npy_header(array):
+    buf = io.BytesIO()
+    np.lib.format.write_array_header_1_0(buf, np.lib.format.header_data_from_array_1_0(array))
+    return buf.getvalue()
+
+
+def write_checkpoint(path, data):
+    """
+    Atomically write a checkpoint dict (values: JSON types, numpy arrays
+    or nested dicts of those) to path.
+    """
+    fields, arrays = _flatten(data)
+    blocks, layout, offset = [], {}, 0
+    for name, array in arrays.items():
+        header = _npy_header(array)
+        layout[name] = {"offset": offset + len(header), "dtype": array.dtype.str,
+                        "shape": list(array.shape)}
+        blocks.append((offset, header, array))
+        offset = _aligned(offset + len(header) + array.nbytes)
+    data_size = offset
+
+    meta = json.dumps({"fields": fields, "arrays": layout}).encode("utf-8")
+    data_start = _aligned(struct.calcsize(HEADER) + len(meta))
+
+    section = bytearray(data_size)
+    for start, header, array in blocks:
+        section[start:start + len(header)] = header
+        body = start + len(header)
+        section[body:body + array.nbytes] = array.tobytes()
+
+    head = struct.pack(HEADER, MAGIC, SCHEMA_VERSION, len(meta),
+                       zlib.crc32(meta), zlib.crc32(section))
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(head)
+            f.write(meta)
+            f.write(b"\0" * (data_start - len(head) - len(meta)))
+            f.write(section)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.replace(tmp, path)
+        except PermissionError as e:
+            raise PermissionError(e.errno, f"cannot replace {path}; another process may "
+                                           f"have it open or mapped", path) from e
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    _fsync_dir(os.path.dirname(os.path.abspath(path)))
+
+
+def _fsync_dir(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return  # e.g. Windows, where directories cannot be opened
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def read_checkpoint(path, mmap=True, verify=True):
+    """
+    Read a checkpoint. With mmap=True arrays are read-only views into a
+    memory map of the file; otherwise they are private writable copies.
+    On Windows (MAP_REPLACEABLE false) they are always copies, so the
+    file stays replaceable by later saves. Raises ValueError for a file
+    that is not a valid checkpoint.
+    """
+    mmap = mmap and MAP_REPLACEABLE
+    raw = np.memmap(path, dtype=np.uint8, mode="r")
+    head_size = struct.calcsize(HEADER)
+    if raw.size < head_size:
+        raise ValueError(f"{path}: truncated checkpoint")
+    magic, version, meta_len, meta_crc, data_crc = struct.unpack(HEADER, raw[:head_size].tobytes())
+    if magic != MAGIC:
+        raise ValueError(f"{path}: not a Q-table checkpoint")
+    if version != SCHEMA_VERSION:
+        raise ValueError(f"{path}: checkpoint schema {version}, expected {SCHEMA_VERSION}")
+    meta = raw[head_size:head_size + meta_len].tobytes()
+    data_start = _aligned(head_size + meta_len)
+    if verify and (zlib.crc32(meta) != meta_crc or zlib.crc32(raw[data_start:]) != data_crc):
+        raise ValueError(f"{path}: checkpoint checksum mismatch")
+    meta = json.loads(meta)
+
+    flat = dict(meta["fields"])
+    for name, spec in meta["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        start = data_start + spec["offset"]
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        array = raw[start:start + count * dtype.itemsize].view(dtype).reshape(spec["shape"])
+        flat[name] = array if mmap else np.array(array)
+    return _unflatten(flat)
+
+
+def is_checkpoint(path):
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def migrate_pickle(legacy_path, path, check=None):
+    """
+    One-time conversion of a legacy pickled Q-table dict to the checkpoint
+    format. The pickle is left in place. check(data) runs before anything
+    is written and may raise ValueError to reject the table, so a rejected
+    pickle does not leave a bad checkpoint behind.
+    """
+    with open(legacy_path, "rb") as f:
+        data = pickle.load(f)
+    data = {k: v for k, v in data.items() if v is not None}
+    if check is not None:
+        check(data)
+    write_checkpoint(path, data)
+    print(f"[Checkpoint] Migrated {legacy_path} -> {path}")
+
+
+def snapshot(data):
+    """
+    Copy of a checkpoint dict whose arrays no longer share memory with the
+    live tables, so it can be written while training goes on.
+    """
+    return {key: snapshot(value) if isinstance(value, dict)
+            else np.array(value) if isinstance(value, np.ndarray) else value
+            for key, value in data.items()}
+
+
+# =====================================================
+# Background checkpointing
+# =====================================================
+class CheckpointService:
+    """
+    Writes checkpoints on a background thread so the control loop never
+    waits on disk.
+
+    save() only copies the controller's tables (microseconds for a Q-table)
+    and hands the snapshot to the writer thread. If a write is still in
+    progress, newer requests replace the queued snapshot instead of piling
+    up, so only the latest state is written. close() (also run at
+    interpreter exit) writes whatever is still queued.
+
+    A failed write (OSError) is reported in last_error and the next save
+    is tried as usual. Any other exception is a bug in the checkpoint data;
+    it stops the writer, and from then on save() and flush() return False
+    at once instead of waiting for it.
+    """
+    def __init__(self, controller, path=None):
+        self.controller = controller
+        self.path = path or controller.filename
+        self.cond = threading.Condition()
+        self.pending = None
+        self.writing = False
+        self.running = True
+        self.requested = 0
+        self.written = 0
+        self.coalesced = 0
+        self.last_error = None      # exception of the last write, None if it succeeded
+        self.failed = False         # the writer thread has stopped on an error
+        self.thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def save(self):
+        """
+        Queue a snapshot of the controller's current state. Non-blocking.
+        Returns False, queueing nothing, once the writer has failed.
+        """
+        if self.failed:
+            return False
+        data = self.controller.checkpoint_snapshot()
+        with self.cond:
+            if self.pending is not None:
+                self.coalesced += 1
+            self.pending = data
+            self.requested += 1
+            self.cond.notify_all()
+        return True
+
+    def flush(self, timeout=None):
+        """
+        Wait until every queued snapshot has been written. Returns False
+        on timeout, if the last write failed or if the writer has stopped.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            while (self.pending is not None or self.writing) and not self.failed:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+        return not self.failed and self.last_error is None
+
+    def close(self, timeout=30.0):
+        """
+        Flush (waiting at most timeout seconds) and stop the writer thread.
+        Returns True if everything queued was written without error. Safe
+        to call more than once.
+        """
+        if not self.running:
+            return not self.failed and self.last_error is None
+        flushed = self.flush(timeout)
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.thread.join(timeout)
+        atexit.unregister(self.close)
+        return flushed
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.pending is None and self.running:
+                    self.cond.wait()
+                if self.pending is None:
+                    return
+                data, self.pending = self.pending, None
+                self.writing = True
+            try:
+                write_checkpoint(self.path, data)
+                self.written += 1
+                self.last_error = None
+                journal = self.controller.journal
+                if journal is not None and "journal_segment" in data:
+                    journal.compact(data["journal_segment"])
+            except OSError as e:
+                self.last_error = e
+                print(f"[Checkpoint] Background save to {self.path} failed: {e}")
+            except Exception as e:
+                self.last_error = e
+                print(f"[Checkpoint] Background writer stopped: {e!r}")
+                with self.cond:
+                    self.failed = True
+                    self.pending = None
+            finally:
+                with self.cond:
+                    self.writing = False
+                    self.cond.notify_all()
+            if self.failed:
+                return
@@ -1,53 +1,824 @@
 
+import asyncio
+import collections
 import socket
+import selectors
 import json
 import time
+import threading
+
+import Protocol
+
+class FrameBuffer:
+    """
+    Newline framing for the JSON-line protocol on top of a bytearray.
+
+    Socket data is received straight into a preallocated chunk with
+    recv_into() and appended to the pending bytes. Newlines are searched
+    incrementally from where the previous search stopped, and only complete
+    frames are handed out, so a multi-byte UTF-8 character split across two
+    reads is never decoded in halves. After set_binary() frames are cut by
+    the length prefix of the binary protocol instead (see Protocol.py).
+    """
+    def __init__(self, chunk_size=65536):
+        self.binary = False
+        self.data = bytearray()
+        self.chunk = bytearray(chunk_size)
+        self.view = memoryview(self.chunk)
+        self.start = 0      # offset of the first unconsumed byte
+        self.scan = 0       # no newline exists in data[start:scan]
+
+    def __len__(self):
+        return len(self.data) - self.start
+
+    def recv_from(self, sock):
+        """
+        Receive one chunk from the socket. Returns the number of bytes read
+        (0 means the peer closed the connection).
+        """
+        n = sock.recv_into(self.view)
+        if n:
+            self.data += self.view[:n]
+        return n
+
+    def feed(self, data):
+        self.data += data
+
+    def unread(self, data):
+        """
+        Put framed bytes back in front of the unconsumed data, e.g. frames
+        read ahead during the protocol handshake.
+        """
+        self.data[self.start:self.start] = data
+        self.scan = self.start
+
+    def set_binary(self):
+        # Bytes after the frame just consumed are already binary framed
+        self.binary = True
+        self.scan = self.start
+
+    def next_frame(self):
+        """
+        Return the next complete frame as bytes (without the newline), or
+        None if no complete frame is buffered.
+        """
+        if self.binary:
+            return self._next_binary_frame()
+        idx = self.data.find(b"\n", self.scan)
+        if idx < 0:
+            self.scan = len(self.data)
+            self._compact()
+            return None
+        frame = bytes(self.data[self.start:idx])
+        self.start = self.scan = idx + 1
+        return frame
+
+    def _next_binary_frame(self):
+        length = Protocol.frame_length(self.data, self.start)
+        if length is None or len(self.data) - self.start < length:
+            self._compact()
+            return None
+        end = self.start + length
+        frame = bytes(self.data[self.start:end])
+        self.start = self.scan = end
+        return frame
+
+    def frames(self):
+        """
+        Yield every complete frame currently buffered.
+        """
+        while True:
+            frame = self.next_frame()
+            if frame is None:
+                return
+            yield frame
+
+    def _compact(self):
+        # Drop consumed bytes in one go rather than once per frame
+        if self.start:
+            del self.data[:self.start]
+            self.scan -= self.start
+            self.start = 0
+
+
+class SensorRing:
+    """
+    Fixed-size ring of timestamped sensor frames.
+
+    All slots are preallocated. A single writer (the receiver thread) fills
+    the next slot and then publishes its sequence number; readers never take
+    a lock, they re-check the slot sequence to detect a slot that was
+    overwritten while they were reading it.
+    """
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.frames = [None] * capacity
+        self.stamps = [0.0] * capacity      # time.monotonic() at arrival
+        self.seqs = [-1] * capacity
+        self.seq = -1                       # newest published sequence
+        self.cond = threading.Condition()
+
+    def push(self, sensors, stamp):
+        seq = self.seq + 1
+        slot = seq % self.capacity
+        self.seqs[slot] = -1                # mark slot as being written
+        self.frames[slot] = sensors
+        self.stamps[slot] = stamp
+        self.seqs[slot] = seq
+        self.seq = seq
+        with self.cond:
+            self.cond.notify_all()
+
+    def _read(self, seq):
+        slot = seq % self.capacity
+        sensors, stamp = self.frames[slot], self.stamps[slot]
+        if self.seqs[slot] != seq:
+            return None                     # overwritten while reading
+        return seq, stamp, sensors
+
+    def latest(self):
+        """
+        Return (seq, stamp, sensors) for the newest frame, or None.
+        """
+        while True:
+            seq = self.seq
+            if seq < 0:
+                return None
+            entry = self._read(seq)
+            if entry is not None:
+                return entry
+
+    def since(self, seq):
+        """
+        Return the frames newer than seq that are still held in the ring,
+        oldest first, as a list of (seq, stamp, sensors).
+        """
+        newest = self.seq
+        first = max(seq + 1, newest - self.capacity + 1, 0)
+        entries = []
+        for s in range(first, newest + 1):
+            entry = self._read(s)
+            if entry is not None:
+                entries.append(entry)
+        return entries
+
+    def wait(self, after_seq, timeout=None):
+        """
+        Block until a frame newer than after_seq is published. Returns the
+        newest (seq, stamp, sensors), or None on timeout.
+        """
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.seq > after_seq, timeout):
+                return None
+        return self.latest()
+
 
 class CoppeliaClient:
-    def __init__(self, host='127.0.0.1', port=50002):
+    def __init__(self, host='127.0.0.1', port=50002, keepalive=0.5, protocol="json",
+                 auto_reconnect=True, max_backoff=5.0, max_reconnect_attempts=10,
+                 robot_queue_size=16):
         self.host = host
         self.port = port
+        self.protocol = protocol    # "json", or "binary" to negotiate Protocol.py framing
+        self.keepalive = keepalive  # resend an unchanged command after this many seconds (0: always)
         self.sock = None
-        self.buffer = ""
+        self.buffer = FrameBuffer()
+        self.selector = None
+        self.frames_skipped = 0     # stale sensor frames dropped by drain mode
+        self.ring = None
+        self.receiver = None
+        self.receiver_running = False
+        self.command_cache = {}     # (L, R) or (robot, L, R) -> encoded set_speed prefix
+        self.last_command = None
+        self.last_command_time = 0.0
+        self.commands_suppressed = 0
+        # Reconnection and session state
+        self.auto_reconnect = auto_reconnect
+        self.max_backoff = max_backoff
+        self.max_reconnect_attempts = max_reconnect_attempts
+        self.reconnect_count = 0
+        self.closed = True
+        self.sim_running = None     # True/False once started/stopped, replayed on reconnect
+        self.last_motor = None      # args of the last send_motor_command
+        # Held while the socket is used or replaced, so a reconnect on the
+        # receiver thread and a send from the control loop never interleave
+        self.lock = threading.RLock()
+        # Multi-robot sessions
+        self.robot_queues = {}      # robot ID -> deque of sensor dicts, oldest first
+        self.robot_queue_size = robot_queue_size
+        self.pending_commands = {}  # robot ID -> encoded set_speed for the next flush
+        self.last_robot_motor = {}  # robot ID -> args of its last queued command
 
     def connect(self):
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.sock.connect((self.host, self.port))
-        self.sock.settimeout(0.1)
-    
-    def send_motor_command(self, left_speed, right_speed,state=0,reward=0,action=0):
-        cmd = {"command": "set_speed", "L": left_speed, "R": right_speed,"State":state,"Reward":reward,"Action":action}
+        self._open()
+        self.closed = False
+
+    def _open(self):
+        with self.lock:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.sock.connect((self.host, self.port))
+            self.sock.settimeout(0.1)
+            self.selector = selectors.DefaultSelector()
+            self.selector.register(self.sock, selectors.EVENT_READ)
+            self.buffer = FrameBuffer()
+            self.command_cache.clear()
+            self.last_command = None
+            if self.protocol == "binary":
+                self._negotiate_binary()
+
+    def _close_socket(self):
+        with self.lock:
+            if self.selector:
+                self.selector.close()
+                self.selector = None
+            if self.sock:
+                self.sock.close()
+                self.sock = None
+
+    # =====================================================
+    # Reconnection
+    # =====================================================
+    def reconnect(self):
+        """
+        Reopen the connection with exponential backoff (capped at
+        max_backoff seconds), then restore the simulation state and the last
+        motor command. Returns False once max_reconnect_attempts have failed;
+        the next send or receive starts a new round of attempts (the
+        receiver thread keeps starting them on its own).
+
+        Runs under the client lock: the other thread's sends and receives
+        wait for it instead of seeing a half-replaced socket.
+        """
+        with self.lock:
+            self._close_socket()
+            delay = 0.1
+            for attempt in range(1, self.max_reconnect_attempts + 1):
+                if self.closed:
+                    return False
+                try:
+                    self._open()
+                    self._resume_session()
+                except OSError as e:
+                    self._close_socket()
+                    print(f"[CoppeliaClient] Reconnect attempt {attempt} failed: {e}")
+                    if attempt < self.max_reconnect_attempts:
+                        time.sleep(delay)
+                        delay = min(delay * 2, self.max_backoff)
+                    continue
+                self.reconnect_count += 1
+                print(f"[CoppeliaClient] Reconnected (reconnect #{self.reconnect_count})")
+                return True
+            return False
+
+    def _resume_session(self):
+        if self.sim_running is not None:
+            self.sock.sendall(self._encode_simulation_command(self.sim_running))
+        if self.last_motor is not None:
+            msg = self._encode_motor_command(*self.last_motor)
+            self.sock.sendall(msg)
+            self.last_command = msg
+            self.last_command_time = time.monotonic()
+        if self.last_robot_motor:
+            self.sock.sendall(b"".join(self._encode_robot_command(robot, *args)
+                                       for robot, args in self.last_robot_motor.items()))
+
+    def _connection_lost(self, reason, sock=None):
+        """
+        Drop the dead socket and, if enabled, reconnect. Returns True if the
+        session is usable again. sock is the socket that failed; if another
+        thread has already replaced it, its reconnect is not repeated.
+        """
+        with self.lock:
+            if sock is not None and sock is not self.sock:
+                return self.sock is not None
+            print(f"[CoppeliaClient] Connection lost: {reason}")
+            self._close_socket()
+            if self.auto_reconnect and not self.closed:
+                return self.reconnect()
+            return False
+
+    def _ensure_connected(self):
+        with self.lock:
+            if self.sock is not None:
+                return True
+            if self.auto_reconnect and not self.closed:
+                return self.reconnect()
+            return False
+
+    def _send(self, msg):
+        """
+        Send raw bytes. Every caller records what it sends in the session
+        state (simulation state, last motor commands) first, and a
+        reconnect replays that state, so a message that needs a reconnect,
+        before or after the write, is not sent again. Returns False if still
+        disconnected.
+        """
+        with self.lock:
+            if self.sock is None:
+                if self._ensure_connected():
+                    return True     # replayed by _resume_session
+                print("[CoppeliaClient] Not connected, command dropped")
+                return False
+            sock = self.sock
+            try:
+                sock.sendall(msg)
+                return True
+            except OSError as e:
+                return self._connection_lost(e, sock)
+
+    def _negotiate_binary(self, timeout=0.5):
+        """
+        Offer the binary protocol and switch to it if the wrapper
+        acknowledges. Otherwise stay on JSON lines. Frames that arrive
+        before the answer (the wrapper may send a sensor frame right after
+        accepting) are put back for the readers, re-encoded in binary once
+        the switch is made.
+        """
+        self.sock.sendall(Protocol.encode_json(Protocol.HELLO_REQUEST))
+        deadline = time.monotonic() + timeout
+        held = []
+        while True:
+            for line in self.buffer.frames():
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    continue
+                if msg == Protocol.HELLO_ACK:
+                    self.buffer.set_binary()
+                    self.buffer.unread(b"".join(
+                        Protocol.encode_sensor_update(m["sensors"], m.get("robot"))
+                        for _, m in held if m.get("type") == "sensor_update"))
+                    self.command_cache.clear()
+                    print("[CoppeliaClient] Using binary protocol")
+                    return True
+                held.append((line, msg))
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.selector.select(remaining):
+                break
+            try:
+                if not self.buffer.recv_from(self.sock):
+                    break
+            except socket.timeout:
+                continue
+        self.buffer.unread(b"".join(line + b"\n" for line, _ in held))
+        print("[CoppeliaClient] Binary protocol not acknowledged, using JSON lines")
+        return False
+
+    def _decode(self, line):
+        if self.buffer.binary:
+            return Protocol.decode_message(line)
+        return json.loads(line)
+
+    def _is_sensor_frame(self, line):
+        if self.buffer.binary:
+            return Protocol.is_sensor_update(line)
+        return b'"sensor_update"' in line
+
+    # =====================================================
+    # Motor commands
+    # =====================================================
+    def _encode_motor_command(self, left_speed, right_speed, state=0, reward=0, action=0):
+        key = (left_speed, right_speed)
+        prefix = self.command_cache.get(key)
+        if self.buffer.binary:
+            if prefix is None:
+                prefix = self._cache_prefix(key, Protocol.set_speed_prefix(left_speed, right_speed))
+            return prefix + Protocol.set_speed_tail(state, reward, action)
+        if prefix is None:
+            prefix = self._cache_prefix(key, Protocol.json_set_speed_prefix(left_speed, right_speed))
+        return prefix + Protocol.json_set_speed_tail(state, reward, action)
+
+    def _cache_prefix(self, key, prefix):
+        if len(self.command_cache) >= 4096:
+            self.command_cache.clear()
+        self.command_cache[key] = prefix
+        return prefix
+
+    def _encode_simulation_command(self, start):
+        if self.buffer.binary:
+            if start:
+                return Protocol.encode_start_simulation()
+            return Protocol.encode_stop_simulation()
+        cmd = {"command": "start_simulation" if start else "stop_simulation"}
         msg = json.dumps(cmd) + "\n"
-        self.sock.sendall(msg.encode())
-    
+        return msg.encode()
+
+    def preencode_motor_commands(self, speed_pairs, robots=None):
+        """
+        Encode the set_speed prefix for every (L, R) pair of the action
+        table up front, so the control loop only formats the per-tick
+        State, Reward and Action. With robots, the robot-tagged prefixes
+        for those IDs are encoded too.
+        """
+        for left_speed, right_speed in speed_pairs:
+            self._encode_motor_command(left_speed, right_speed)
+            for robot in robots or ():
+                self._encode_robot_command(robot, left_speed, right_speed)
+
+    def send_motor_command(self, left_speed, right_speed,state=0,reward=0,action=0,force=False):
+        """
+        Send a set_speed command. A command identical to the previous one is
+        not retransmitted until the keepalive interval has passed, unless
+        force is set. Returns True if the command went on the wire.
+        """
+        self.last_motor = (left_speed, right_speed, state, reward, action)
+        msg = self._encode_motor_command(left_speed, right_speed, state, reward, action)
+        now = time.monotonic()
+        if (not force and msg == self.last_command
+                and now - self.last_command_time < self.keepalive):
+            self.commands_suppressed += 1
+            return False
+        reconnects = self.reconnect_count
+        if not self._send(msg):
+            return False
+        if self.reconnect_count == reconnects:
+            # otherwise the reconnect already replayed (and recorded) it
+            self.last_command = msg
+            self.last_command_time = now
+        return True
+
     def start_simulation(self):
-        cmd = {"command": "start_simulation"}
-        msg = json.dumps(cmd) + "\n"
-        self.sock.sendall(msg.encode())
+        self.sim_running = True
+        return self._send(self._encode_simulation_command(True))
 
     def stop_simulation(self):
-        cmd = {"command": "stop_simulation"}
-        msg = json.dumps(cmd) + "\n"
-        self.sock.sendall(msg.encode())
+        self.sim_running = False
+        return self._send(self._encode_simulation_command(False))
 
     def receive_sensor_data(self):
+        if not self._ensure_connected():
+            return None
         try:
-            data = self.sock.recv(1024).decode()
-            if not data:
+            if not self.buffer.recv_from(self.sock):
+                self._connection_lost("closed by peer")
                 return None
-            self.buffer += data
-            if "\n" in self.buffer:
-                line, self.buffer = self.buffer.split("\n", 1)
-                sensor_msg = json.loads(line)
+            line = self.buffer.next_frame()
+            if line is not None:
+                sensor_msg = self._decode(line)
                 if sensor_msg.get("type") == "sensor_update":
                     return sensor_msg["sensors"]
         except socket.timeout:
             pass
+        except OSError as e:
+            self._connection_lost(e)
         except Exception as e:
             print(f"[CoppeliaClient] Error receiving sensor data: {e}")
         return None
 
+    # =====================================================
+    # Event-driven receive path
+    # =====================================================
+    def _pop_sensor_frame(self):
+        """
+        Return the sensors of the next buffered sensor_update frame, or None
+        if no complete one is buffered. Other message types are dropped.
+        """
+        for line in self.buffer.frames():
+            try:
+                sensor_msg = self._decode(line)
+            except ValueError as e:
+                print(f"[CoppeliaClient] Dropping malformed frame: {e}")
+                continue
+            if sensor_msg.get("type") == "sensor_update":
+                return sensor_msg["sensors"]
+        return None
+
+    def wait_for_sensor_data(self, timeout=0.5):
+        """
+        Block in the selector until a complete sensor frame is available and
+        return it immediately. Returns None if the timeout expires or the
+        connection was closed.
+        """
+        sensors = self._pop_sensor_frame()
+        if sensors is not None:
+            return sensors
+        if not self._ensure_connected():
+            return None
+
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            if not self.selector.select(remaining):
+                return None
+            try:
+                received = self.buffer.recv_from(self.sock)
+            except socket.timeout:
+                continue
+            except OSError as e:
+                self._connection_lost(e)
+                return None
+            if not received:
+                self._connection_lost("closed by peer")
+                return None
+            sensors = self._pop_sensor_frame()
+            if sensors is not None:
+                return sensors
+
+    # =====================================================
+    # "Latest frame only" drain mode
+    # =====================================================
+    def _read_available(self):
+        """
+        Read everything the kernel has buffered without blocking.
+        Returns False if the connection died.
+        """
+        while self.selector.select(0):
+            try:
+                received = self.buffer.recv_from(self.sock)
+            except socket.timeout:
+                break
+            except OSError as e:
+                print(f"[CoppeliaClient] Error receiving sensor data: {e}")
+                return False
+            if not received:
+                print("[CoppeliaClient] Connection closed by peer")
+                return False
+        return True
+
+    def wait_for_latest_sensor_data(self, timeout=0.5):
+        """
+        Drain every complete frame that is available and return
+        (sensors, skipped) for the newest sensor_update only. Older sensor
+        frames are counted in skipped without being parsed. Returns
+        (None, 0) if no sensor frame arrives before the timeout.
+        """
+        if not self._ensure_connected():
+            return None, 0
+        deadline = time.monotonic() + timeout
+        while True:
+            closed = not self._read_available()
+            candidates = [line for line in self.buffer.frames()
+                          if self._is_sensor_frame(line)]
+            for idx in range(len(candidates) - 1, -1, -1):
+                try:
+                    sensor_msg = self._decode(candidates[idx])
+                except ValueError as e:
+                    print(f"[CoppeliaClient] Dropping malformed frame: {e}")
+                    continue
+                if sensor_msg.get("type") == "sensor_update":
+                    skipped = len(candidates) - 1
+                    self.frames_skipped += skipped
+                    return sensor_msg["sensors"], skipped
+
+            if closed:
+                self._connection_lost("receive failed")
+                return None, 0
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.selector.select(remaining):
+                return None, 0
+
+    # =====================================================
+    # Background receiver thread
+    # =====================================================
+    def start_receiver(self, capacity=64):
+        """
+        Start a thread that continuously parses sensor frames into a
+        SensorRing. While it runs the control loop must read frames through
+        latest()/since()/wait_for_frame() instead of the receive methods.
+        """
+        self.ring = SensorRing(capacity)
+        self.receiver_running = True
+        self.receiver = threading.Thread(target=self._receive_loop, daemon=True)
+        self.receiver.start()
+
+    def stop_receiver(self):
+        self.receiver_running = False
+        if self.receiver:
+            self.receiver.join()
+            self.receiver = None
+
+    def _receive_loop(self):
+        while self.receiver_running:
+            with self.lock:
+                connected = self._ensure_connected()
+                sock, selector = self.sock, self.selector
+            if not connected:
+                if self.closed or not self.auto_reconnect:
+                    break
+                # Still down after a round of attempts: wait and start
+                # another, so frames resume whenever the wrapper is back
+                self._receiver_pause(self.max_backoff)
+                continue
+            try:
+                # Wait without the lock so the control loop can keep sending
+                if not selector.select(0.1):
+                    continue
+            except (OSError, ValueError):
+                continue    # replaced by a reconnect on the other thread
+            with self.lock:
+                if sock is not self.sock:
+                    continue
+                try:
+                    if not self.buffer.recv_from(sock):
+                        self._connection_lost("closed by peer", sock)
+                        continue
+                except socket.timeout:
+                    continue
+                except OSError as e:
+                    self._connection_lost(e, sock)
+                    continue
+                stamp = time.monotonic()
+                for line in self.buffer.frames():
+                    try:
+                        sensor_msg = self._decode(line)
+                    except ValueError as e:
+                        print(f"[CoppeliaClient] Dropping malformed frame: {e}")
+                        continue
+                    if sensor_msg.get("type") == "sensor_update":
+                        self.ring.push(sensor_msg["sensors"], stamp)
+        self.receiver_running = False
+
+    def _receiver_pause(self, seconds):
+        deadline = time.monotonic() + seconds
+        while self.receiver_running and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def latest(self):
+        """
+        Newest frame from the receiver thread as (seq, stamp, sensors), or
+        None. The frame age is time.monotonic() - stamp.
+        """
+        return self.ring.latest()
+
+    def since(self, seq):
+        return self.ring.since(seq)
+
+    def wait_for_frame(self, after_seq=-1, timeout=0.5):
+        return self.ring.wait(after_seq, timeout)
+
+    # =====================================================
+    # Multi-robot sessions
+    # =====================================================
+    # With several robots in the scene every sensor_update carries a robot
+    # ID. wait_for_robot_frames() demultiplexes incoming frames into one
+    # bounded queue per robot; queue_motor_command() stages one set_speed
+    # per robot and flush_motor_commands() sends all of them in one write.
+    def _demux(self, line):
+        """
+        Route one frame to its robot's queue. Returns the robot ID, or None
+        for frames that are not sensor updates.
+        """
+        try:
+            msg = self._decode(line)
+        except ValueError as e:
+            print(f"[CoppeliaClient] Dropping malformed frame: {e}")
+            return None
+        if msg.get("type") != "sensor_update":
+            return None
+        robot = msg.get("robot", 0)
+        queue = self.robot_queues.get(robot)
+        if queue is None:
+            queue = self.robot_queues[robot] = collections.deque(maxlen=self.robot_queue_size)
+        queue.append(msg["sensors"])
+        return robot
+
+    def wait_for_robot_frames(self, robots=None, timeout=0.5):
+        """
+        Wait until every robot in robots (default: all robots heard from so
+        far) has a queued frame, then return {robot: newest sensors} and
+        empty those queues; older frames count as skipped. After the timeout
+        whatever is queued is returned (possibly {}).
+        """
+        if not self._ensure_connected():
+            return {}
+        deadline = time.monotonic() + timeout
+        while True:
+            closed = not self._read_available()
+            for line in self.buffer.frames():
+                self._demux(line)
+            expected = self.robot_queues.keys() if robots is None else robots
+            queues = self.robot_queues
+            ready = bool(queues) and all(queues.get(robot) for robot in expected)
+            if closed:
+                self._connection_lost("receive failed")
+                break
+            remaining = deadline - time.monotonic()
+            if ready or remaining <= 0 or not self.selector.select(remaining):
+                break
+        frames = {}
+        for robot, queue in self.robot_queues.items():
+            if queue and (robots is None or robot in robots):
+                self.frames_skipped += len(queue) - 1
+                frames[robot] = queue[-1]
+                queue.clear()
+        return frames
+
+    def _encode_robot_command(self, robot, left_speed, right_speed, state=0, reward=0, action=0):
+        key = (robot, left_speed, right_speed)
+        prefix = self.command_cache.get(key)
+        if self.buffer.binary:
+            if prefix is None:
+                prefix = self._cache_prefix(
+                    key, Protocol.set_speed_prefix(left_speed, right_speed, robot))
+            return prefix + Protocol.set_speed_tail(state, reward, action)
+        if prefix is None:
+            prefix = self._cache_prefix(
+                key, Protocol.json_set_speed_prefix(left_speed, right_speed, robot))
+        return prefix + Protocol.json_set_speed_tail(state, reward, action)
+
+    def queue_motor_command(self, robot, left_speed, right_speed, state=0, reward=0, action=0):
+        """
+        Stage a set_speed for one robot; a later one for the same robot
+        replaces it. Nothing is sent until flush_motor_commands().
+        """
+        self.last_robot_motor[robot] = (left_speed, right_speed, state, reward, action)
+        self.pending_commands[robot] = self._encode_robot_command(
+            robot, left_speed, right_speed, state, reward, action)
+
+    def flush_motor_commands(self):
+        """
+        Send every staged command in a single write. Returns how many
+        commands went out.
+        """
+        if not self.pending_commands:
+            return 0
+        msg = b"".join(self.pending_commands.values())
+        count = len(self.pending_commands)
+        self.pending_commands.clear()
+        # After a reconnect _send has replayed them with the session state
+        return count if self._send(msg) else 0
+
     def close(self):
-        if self.sock:
-            self.sock.close()
-            self.sock = None
+        self.closed = True
+        self.stop_receiver()
+        self._close_socket()
+
+
+class AsyncCoppeliaClient:
+    """
+    asyncio version of CoppeliaClient for the same JSON-line protocol, so
+    several robots, checkpointing and metrics can share one event loop.
+
+        async with AsyncCoppeliaClient() as client:
+            async for sensors in client.sensor_stream():
+                await client.send_motor_command(2.0, 2.0)
+    """
+    def __init__(self, host='127.0.0.1', port=50002):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *excinfo):
+        await self.close()
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def _send(self, cmd):
+        self.writer.write((json.dumps(cmd) + "\n").encode())
+        await self.writer.drain()
+
+    async def send_motor_command(self, left_speed, right_speed, state=0, reward=0, action=0):
+        await self._send({"command": "set_speed", "L": left_speed, "R": right_speed,
+                          "State": state, "Reward": reward, "Action": action})
+
+    async def start_simulation(self):
+        await self._send({"command": "start_simulation"})
+
+    async def stop_simulation(self):
+        await self._send({"command": "stop_simulation"})
+
+    async def receive_sensor_data(self):
+        """
+        Wait for the next sensor_update frame. Returns None once the
+        connection is closed.
+        """
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                return None
+            try:
+                sensor_msg = json.loads(line)
+            except ValueError as e:
+                print(f"[AsyncCoppeliaClient] Dropping malformed frame: {e}")
+                continue
+            if sensor_msg.get("type") == "sensor_update":
+                return sensor_msg["sensors"]
+
+    async def sensor_stream(self):
+        """
+        Async iterator over sensor frames; ends when the connection closes.
+        """
+        while True:
+            sensors = await self.receive_sensor_data()
+            if sensors is None:
+                return
+            yield sensors
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+            self.writer = None
+            self.reader = None
@@ -0,0 +1,96 @@
+import numpy as np
+
+from Qlearning import QLearningController
+
+
+class DoubleQController(QLearningController):
+    """
+    Double Q-learning.
+
+    Two tables, q_a and q_b, are updated alternately. The table being
+    updated picks the best next action and the other one values it, which
+    removes the upward bias of bootstrapping from max over a single noisy
+    table. q_table holds q_a + q_b and is kept up to date in place, so
+    choose_action() and any code that reads q_table for the greedy policy
+    act on both tables without allocating.
+
+    Checkpoints store both tables as q_table_a / q_table_b; q_table is
+    their mean, so a plain QLearningController loads the combined policy.
+    """
+    def __init__(self, n_states=0, n_actions=0, filename="q_table.ckpt", state_spec=None):
+        super().__init__(n_states, n_actions, filename, state_spec)
+        self.q_a = np.zeros_like(self.q_table)
+        self.q_b = np.zeros_like(self.q_table)
+        self.turn = 0   # 0: next single update goes to q_a, 1: to q_b
+
+    def update_q_table(self, state, action, reward, next_state):
+        if isinstance(action, str):
+            action = self.actions[action]
+        self.iteration += 1
+        table_id = self.turn
+        if table_id == 0:
+            learn, judge = self.q_a, self.q_b
+        else:
+            learn, judge = self.q_b, self.q_a
+        self.turn ^= 1
+        best = learn[next_state].argmax()
+        current_q = learn[state, action]
+        new_q = current_q + self.lr * (reward + self.gamma * judge[next_state, best] - current_q)
+        learn[state, action] = new_q
+        self.q_table[state, action] = self.q_a[state, action] + self.q_b[state, action]
+        if self.journal is not None:
+            self.journal.record(self.iteration, state, action, new_q, table_id)
+
+    def update_batch(self, states, actions, rewards, next_states, dones=None, weights=None):
+        """
+        Batched form of update_q_table: transitions alternate between the
+        two tables in batch order, each half updated as in
+        QLearningController.update_batch (including per-transition
+        weights). Returns the TD errors.
+        """
+        states = np.asarray(states, dtype=np.intp)
+        actions = np.asarray(actions, dtype=np.intp)
+        rewards = np.asarray(rewards, dtype=np.float64)
+        next_states = np.asarray(next_states, dtype=np.intp)
+        steps = None if weights is None else self.lr * np.asarray(weights, dtype=np.float64)
+        to_b = (np.arange(len(states)) + self.turn) % 2 == 1
+        self.turn = (self.turn + len(states)) % 2
+
+        td_errors = np.empty(len(states))
+        for table_id, (learn, judge, mask) in enumerate(((self.q_a, self.q_b, ~to_b),
+                                                        (self.q_b, self.q_a, to_b))):
+            s, a, r, ns = states[mask], actions[mask], rewards[mask], next_states[mask]
+            if len(s) == 0:
+                continue
+            best = learn[ns].argmax(axis=1)
+            targets = r + self.gamma * judge[ns, best]
+            if dones is not None:
+                targets = np.where(np.asarray(dones)[mask], r, targets)
+            td_errors[mask] = targets - learn[s, a]
+            self._apply_targets(learn, s, a, targets, table_id,
+                                None if steps is None else steps[mask])
+        np.add(self.q_a, self.q_b, out=self.q_table)
+        return td_errors
+
+    # =====================================================
+    # Q-table persistence
+    # =====================================================
+    def _checkpoint_data(self):
+        data = super()._checkpoint_data()
+        data["q_table"] = self.q_table / 2
+        data["q_table_a"] = self.q_a
+        data["q_table_b"] = self.q_b
+        return data
+
+    def _journal_tables(self):
+        return [self.q_a, self.q_b]
+
+    def _journal_replayed(self):
+        np.add(self.q_a, self.q_b, out=self.q_table)
+
+    def _restore_checkpoint(self, data):
+        super()._restore_checkpoint(data)
+        # A single-table checkpoint seeds both tables with the same values
+        self.q_a = np.array(data.get("q_table_a", self.q_table), dtype=np.float64)
+        self.q_b = np.array(data.get("q_table_b", self.q_table), dtype=np.float64)
+        self.q_table = self.q_a + self.q_b
@@ -0,0 +1,106 @@
+import heapq
+
+import numpy as np
+
+from Qlearning import QLearningController
+
+
+class DynaQController(QLearningController):
+    """
+    Q-learning plus Dyna-style planning.
+
+    Every real transition passed to update_q_table() is also written into a
+    tabular model that remembers, per (state, action), the last next state
+    and reward seen. plan(k) then replays k imagined transitions from that
+    model, which costs only CPU time, between real control ticks.
+
+    With prioritized=True planning uses prioritized sweeping: pairs whose
+    TD error exceeds theta are queued by |TD error|, and after a pair is
+    updated its known predecessors are re-queued, so value changes spread
+    backwards from where they happened.
+    """
+    def __init__(self, n_states=0, n_actions=0, filename="q_table.ckpt", state_spec=None,
+                 prioritized=False, theta=1e-3, seed=None):
+        super().__init__(n_states, n_actions, filename, state_spec)
+        self.prioritized = prioritized
+        self.theta = theta
+        self.rng = np.random.default_rng(seed)
+        self.reset_model()
+
+    def reset_model(self):
+        n_states, n_actions = self.q_table.shape
+        self.model_next = np.full((n_states, n_actions), -1, dtype=np.int32)
+        self.model_reward = np.zeros((n_states, n_actions), dtype=np.float64)
+        self.seen_pairs = np.zeros(n_states * n_actions, dtype=np.int64)
+        self.n_seen = 0
+        self.predecessors = [set() for _ in range(n_states)]
+        self.queue = []
+
+    def load_q_table(self, mmap=False):
+        loaded = super().load_q_table(mmap)
+        if loaded:
+            self.reset_model()
+        return loaded
+
+    # =====================================================
+    # Learning from real transitions
+    # =====================================================
+    def update_q_table(self, state, action, reward, next_state):
+        if isinstance(action, str):
+            action = self.actions[action]
+        super().update_q_table(state, action, reward, next_state)
+
+        n_actions = self.model_next.shape[1]
+        if self.model_next[state, action] < 0:
+            self.seen_pairs[self.n_seen] = state * n_actions + action
+            self.n_seen += 1
+        self.model_next[state, action] = next_state
+        self.model_reward[state, action] = reward
+        self.predecessors[next_state].add(state * n_actions + action)
+        if self.prioritized:
+            self._queue_pair(state, action)
+
+    # =====================================================
+    # Planning
+    # =====================================================
+    def plan(self, k):
+        """
+        Run k planning updates from the model. Returns how many were done.
+        """
+        if self.n_seen == 0 or k <= 0:
+            return 0
+        if self.prioritized:
+            return self._sweep(k)
+        n_actions = self.model_next.shape[1]
+        pairs = self.seen_pairs[self.rng.integers(0, self.n_seen, k)]
+        states, actions = pairs // n_actions, pairs % n_actions
+        self.update_batch(states, actions, self.model_reward[states, actions],
+                          self.model_next[states, actions])
+        return k
+
+    def _td_error(self, state, action):
+        target = self.model_reward[state, action] \
+            + self.gamma * self.q_table[self.model_next[state, action]].max()
+        return target - self.q_table[state, action]
+
+    def _queue_pair(self, state, action):
+        priority = abs(self._td_error(state, action))
+        if priority > self.theta:
+            heapq.heappush(self.queue, (-priority, state, action))
+
+    def _sweep(self, k):
+        n_actions = self.model_next.shape[1]
+        done = 0
+        while self.queue and done < k:
+            _, state, action = heapq.heappop(self.queue)
+            self.q_table[state, action] += self.lr * self._td_error(state, action)
+            if self.journal is not None:
+                self.journal.record(self.iteration, state, action, self.q_table[state, action])
+            done += 1
+            for pair in self.predecessors[state]:
+                self._queue_pair(pair // n_actions, pair % n_actions)
+        # Stale duplicates pile up in the heap; keep it bounded
+        if len(self.queue) > 16 * self.model_next.size:
+            self.queue = heapq.nsmallest(self.model_next.size, self.queue)
+            heapq.heapify(self.queue)
+        return done
@@ -0,0 +1,173 @@
+import math
+import random
+import time
+
+import numpy as np
+
+# =====================================================
+# Exploration schedulers
+# =====================================================
+# A scheduler is attached to a controller as ql.exploration and then makes
+# every choose_action() decision. It keeps visit counts per (state, action)
+# and per state in compact uint32 arrays, so schedules can follow how much
+# of the state space has actually been seen instead of a global tick count:
+#
+#     ql.exploration = EpsilonGreedy(Decay(0.3, 0.05, half_life=200), clock="visits")
+#
+# Its counters are saved with the Q-table (see state_dict()).
+
+
+class Decay:
+    """
+    Exponential schedule from start towards end: the distance to end
+    halves every half_life units of whatever clock the scheduler uses.
+    """
+    def __init__(self, start, end=0.0, half_life=500.0):
+        self.start = start
+        self.end = end
+        self.half_life = half_life
+
+    def __call__(self, t):
+        return self.end + (self.start - self.end) * 0.5 ** (t / self.half_life)
+
+
+class ExplorationScheduler:
+    # clock: "step"   - choose_action() calls so far
+    #        "time"   - seconds of training, carried across save/load
+    #        "visits" - visits of the current state (per-state schedule)
+    CLOCKS = ("step", "time", "visits")
+
+    def __init__(self, clock="step", seed=None):
+        if clock not in self.CLOCKS:
+            raise ValueError(f"unknown clock {clock!r}, expected one of {self.CLOCKS}")
+        self.clock = clock
+        self.rng = random.Random(seed)
+        self.counts = None          # (n_states, n_actions) visits
+        self.state_counts = None    # (n_states,) visits
+        self.steps = 0
+        self.elapsed = 0.0          # seconds before the current session
+        self.started = time.monotonic()
+
+    def bind(self, n_states, n_actions):
+        """
+        Allocate the counters for a table shape (keeps them if they match).
+        """
+        if self.counts is None or self.counts.shape != (n_states, n_actions):
+            self.counts = np.zeros((n_states, n_actions), dtype=np.uint32)
+            self.state_counts = np.zeros(n_states, dtype=np.uint32)
+
+    def now(self, state):
+        """
+        Current value of the scheduler's clock for a state.
+        """
+        if self.clock == "visits":
+            return int(self.state_counts[state])
+        if self.clock == "time":
+            return self.elapsed + time.monotonic() - self.started
+        return self.steps
+
+    def choose(self, q_table, state):
+        """
+        Pick an action for state from q_table and count the visit.
+        """
+        if self.counts is None:
+            self.bind(*q_table.shape)
+        action = self.select(q_table[state], state)
+        self.counts[state, action] += 1
+        self.state_counts[state] += 1
+        self.steps += 1
+        return action
+
+    def select(self, q_row, state):
+        raise NotImplementedError
+
+    @staticmethod
+    def _value(setting, t):
+        return setting(t) if callable(setting) else setting
+
+    # =====================================================
+    # Persistence
+    # =====================================================
+    def state_dict(self):
+        return {
+            "kind": type(self).__name__,
+            "counts": self.counts,
+            "state_counts": self.state_counts,
+            "steps": self.steps,
+            "elapsed": self.elapsed + time.monotonic() - self.started,
+        }
+
+    def load_state_dict(self, data):
+        if data.get("kind") != type(self).__name__:
+            print(f"[Exploration] Checkpoint counters are from {data.get('kind')}, "
+                  f"continuing them with {type(self).__name__}")
+        if data.get("counts") is not None:
+            self.counts = np.array(data["counts"], dtype=np.uint32)
+            self.state_counts = np.array(data["state_counts"], dtype=np.uint32)
+        self.steps = int(data.get("steps", 0))
+        self.elapsed = float(data.get("elapsed", 0.0))
+        self.started = time.monotonic()
+
+
+class EpsilonGreedy(ExplorationScheduler):
+    def __init__(self, epsilon=Decay(0.3, 0.05), clock="step", seed=None):
+        """
+        epsilon: a constant or a schedule (e.g. Decay) evaluated on the clock;
+                 with clock="visits" every state gets its own epsilon
+        """
+        super().__init__(clock, seed)
+        self.epsilon = epsilon
+
+    def current_epsilon(self, state=0):
+        return self._value(self.epsilon, self.now(state))
+
+    def select(self, q_row, state):
+        if self.rng.random() < self.current_epsilon(state):
+            return self.rng.randrange(len(q_row))
+        return int(q_row.argmax())
+
+
+class Boltzmann(ExplorationScheduler):
+    def __init__(self, temperature=Decay(1.0, 0.05), clock="step", seed=None):
+        """
+        temperature: a constant or a schedule; actions are drawn with
+                     probability proportional to exp(Q / temperature)
+        """
+        super().__init__(clock, seed)
+        self.temperature = temperature
+
+    def select(self, q_row, state):
+        temperature = self._value(self.temperature, self.now(state))
+        if temperature <= 0:
+            return int(q_row.argmax())
+        top = q_row.max()
+        weights = [math.exp((q - top) / temperature) for q in q_row.tolist()]
+        return self.rng.choices(range(len(weights)), weights)[0]
+
+
+class UCB(ExplorationScheduler):
+    def __init__(self, c=1.0, bonus="ucb", clock="step", seed=None):
+        """
+        Greedy on Q plus an optimism bonus that shrinks with visits:
+            bonus="ucb":   c * sqrt(ln(N_s + 1) / (n_sa + 1))
+            bonus="count": c / sqrt(n_sa + 1)
+        where N_s counts visits of the state and n_sa of the pair. c may be
+        a schedule. Untried actions of a state are taken first.
+        """
+        super().__init__(clock, seed)
+        if bonus not in ("ucb", "count"):
+            raise ValueError(f"unknown bonus {bonus!r}")
+        self.c = c
+        self.bonus = bonus
+
+    def select(self, q_row, state):
+        visits = self.counts[state]
+        untried = np.flatnonzero(visits == 0)
+        if len(untried):
+            return int(untried[self.rng.randrange(len(untried))])
+        c = self._value(self.c, self.now(state))
+        if self.bonus == "ucb":
+            scale = c * math.sqrt(math.log(int(self.state_counts[state]) + 1))
+        else:
+            scale = c
+        return int((q_row + scale / np.sqrt(visits + 1.0)).argmax())
@@ -0,0 +1,269 @@
+import atexit
+import glob
+import os
+import struct
+import threading
+
+import numpy as np
+
+# =====================================================
+# Write-ahead journal of Q-table updates
+# =====================================================
+# Every Q-value a controller writes is appended as a 20-byte record
+#     (iteration, state, action, table, new_q)
+# to the current journal segment. Records are absolute values, so replaying
+# any tail of the journal in order over a checkpoint reproduces the table.
+#
+# Segments are files <base>.<seq>, each starting with MAGIC and the ID of
+# the checkpoint its records build on. Every checkpoint gets a new ID, and
+# at every full checkpoint the journal rotates to a new segment based on
+# it. Recovery after loading a checkpoint replays from the first segment
+# based on that checkpoint's ID; segments from any other history (say, of
+# a trainer that crashed before another process saved a newer checkpoint)
+# predate the checkpoint and are deleted unreplayed. Once a checkpoint is
+# on disk the segments before its own are deleted too (compaction).
+# Appends and rotations only touch in-memory buffers; a background thread
+# creates the segment files, writes and fsyncs them every fsync_interval
+# seconds.
+
+MAGIC = b"EYQJRNL2"
+ID_SIZE = 32        # checkpoint ID in the segment header, ASCII, NUL padded
+RECORD = np.dtype([("iteration", "<u8"), ("state", "<u2"), ("action", "u1"),
+                   ("table", "u1"), ("value", "<f8")])
+RECORD_STRUCT = struct.Struct("<QHBBd")     # same layout, for single records
+
+
+class UpdateJournal:
+    def __init__(self, base, fsync_interval=1.0):
+        """
+        base:           segment path prefix, usually <checkpoint>.journal
+        fsync_interval: max seconds an update can sit unsynced; this is
+                        how much training a crash can lose
+        """
+        self.base = base
+        self.fsync_interval = fsync_interval
+        # lock guards the buffers and is all record() and rotate() take;
+        # file_lock serialises the writes and fsyncs, which can take a while
+        self.lock = threading.Lock()
+        self.file_lock = threading.Lock()
+        self.buffer = bytearray()
+        self.records = 0
+        existing = self.segments()
+        self.seq = existing[-1][0] + 1 if existing else 0
+        self.checkpoint_id = ""     # the current segment builds on this checkpoint
+        # Segments rotate() has finished but the writer has not written
+        # yet, as (seq, checkpoint_id, records), oldest first
+        self.sealed = []
+        # Writer side: the open file of the oldest unwritten segment
+        self.file = None
+        self.file_seq = None
+
+        self.running = True
+        self.wake = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    # =====================================================
+    # Appending
+    # =====================================================
+    def record(self, iteration, state, action, value, table=0):
+        """
+        Append one update. Only copies 20 bytes into the buffer.
+        """
+        rec = RECORD_STRUCT.pack(iteration, state, action, table, value)
+        with self.lock:
+            self.buffer += rec
+            self.records += 1
+
+    def record_batch(self, iteration, states, actions, values, table=0):
+        recs = np.empty(len(states), dtype=RECORD)
+        recs["iteration"] = iteration
+        recs["state"] = states
+        recs["action"] = actions
+        recs["table"] = table
+        recs["value"] = values
+        with self.lock:
+            self.buffer += recs.tobytes()
+            self.records += len(recs)
+
+    def flush(self, sync=True):
+        """
+        Write the segments rotate() has finished and the buffer of the
+        current one (and fsync them). Appends and rotations only wait for
+        the buffer swap, not for the disk.
+        """
+        with self.file_lock:
+            with self.lock:
+                sealed, self.sealed = self.sealed, []
+                data, self.buffer = self.buffer, bytearray()
+                seq, checkpoint_id = self.seq, self.checkpoint_id
+            for old_seq, old_id, old_data in sealed:
+                # Written even if empty: recovery finds the segment based on
+                # a checkpoint by its header
+                self._write(old_seq, old_id, old_data, sync, create=True)
+                self._close_file()
+            self._write(seq, checkpoint_id, data, sync)
+
+    def _write(self, seq, checkpoint_id, data, sync, create=False):
+        if self.file is None:
+            if not (data or create):
+                return
+            self.file = self._open_segment(seq, checkpoint_id)
+            self.file_seq = seq
+        f = self.file
+        if data:
+            f.write(data)
+        f.flush()
+        if sync:
+            os.fsync(f.fileno())
+
+    def _close_file(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            self.file_seq = None
+
+    def _run(self):
+        while self.running:
+            self.wake.wait(self.fsync_interval)
+            self.wake.clear()
+            try:
+                self.flush()
+            except (OSError, ValueError) as e:
+                print(f"[Journal] Flush failed: {e}")
+
+    # =====================================================
+    # Segments
+    # =====================================================
+    def segments(self):
+        """
+        Existing (seq, path) pairs, oldest first.
+        """
+        found = []
+        for path in glob.glob(glob.escape(self.base) + ".*"):
+            suffix = path[len(self.base) + 1:]
+            if suffix.isdigit():
+                found.append((int(suffix), path))
+        return sorted(found)
+
+    def _segment_path(self, seq):
+        return f"{self.base}.{seq:06d}"
+
+    def _open_segment(self, seq, checkpoint_id):
+        f = open(self._segment_path(seq), "ab")
+        if f.tell() == 0:
+            f.write(MAGIC + checkpoint_id.encode("ascii").ljust(ID_SIZE, b"\0"))
+        return f
+
+    def _segment_checkpoint(self, path):
+        """
+        Checkpoint ID a segment builds on, or None if it is not a segment.
+        """
+        with open(path, "rb") as f:
+            header = f.read(len(MAGIC) + ID_SIZE)
+        if len(header) < len(MAGIC) + ID_SIZE or not header.startswith(MAGIC):
+            return None
+        return header[len(MAGIC):].rstrip(b"\0").decode("ascii", "replace")
+
+    def rotate(self, checkpoint_id=""):
+        """
+        Start a new segment based on checkpoint_id. Call when taking the
+        snapshot for a full checkpoint with that ID; returns the token to
+        pass to compact() once that checkpoint is safely written. Only
+        swaps buffers, so it is safe on the control loop; the writer
+        thread creates the files.
+        """
+        with self.lock:
+            self.sealed.append((self.seq, self.checkpoint_id, self.buffer))
+            self.buffer = bytearray()
+            self.seq += 1
+            self.checkpoint_id = checkpoint_id
+            return self.seq
+
+    def compact(self, token):
+        """
+        Delete the segments written before rotate() returned token, and
+        drop those not written yet: the checkpoint holds their updates.
+        """
+        with self.file_lock:
+            with self.lock:
+                self.sealed = [segment for segment in self.sealed if segment[0] >= token]
+            if self.file_seq is not None and self.file_seq < token:
+                self._close_file()
+            for seq, path in self.segments():
+                if seq < token:
+                    os.remove(path)
+
+    # =====================================================
+    # Recovery
+    # =====================================================
+    def read(self, since_segment=0):
+        """
+        All complete records from segment since_segment on, in the order
+        they were written. A torn record at the end of a segment is ignored.
+        """
+        self.flush(sync=False)
+        chunks = []
+        for seq, path in self.segments():
+            if seq < since_segment:
+                continue
+            with open(path, "rb") as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    print(f"[Journal] Skipping {path}: not a journal segment")
+                    continue
+                f.seek(ID_SIZE, os.SEEK_CUR)
+                data = f.read()
+            usable = len(data) - len(data) % RECORD.itemsize
+            chunks.append(np.frombuffer(data[:usable], dtype=RECORD))
+        if not chunks:
+            return np.empty(0, dtype=RECORD)
+        return np.concatenate(chunks)
+
+    def replay(self, tables, since_segment=0):
+        """
+        Apply the journal to tables (indexed by each record's table field).
+        Returns (records applied, last iteration seen, or 0).
+        """
+        recs = self.read(since_segment)
+        for table_id, table in enumerate(tables):
+            sel = recs[recs["table"] == table_id]
+            states = sel["state"].astype(np.intp)
+            actions = sel["action"].astype(np.intp)
+            # Only the last record of each cell matters
+            pairs = (states * table.shape[1] + actions)[::-1]
+            _, first = np.unique(pairs, return_index=True)
+            last = len(sel) - 1 - first
+            table[states[last], actions[last]] = sel["value"][last]
+        last_iteration = int(recs["iteration"].max()) if len(recs) else 0
+        if len(recs):
+            print(f"[Journal] Replayed {len(recs)} updates up to iteration {last_iteration}")
+        return len(recs), last_iteration
+
+    def recover(self, tables, checkpoint_id=""):
+        """
+        After loading the checkpoint with checkpoint_id ("" for none or one
+        without an ID): replay the segments written since it was taken,
+        delete those of other histories, and continue in a new segment.
+        Returns (records applied, last iteration seen, or 0).
+        """
+        segments = self.segments()
+        start = next((seq for seq, path in segments
+                      if self._segment_checkpoint(path) == checkpoint_id), None)
+        replayed = (0, 0) if start is None else self.replay(tables, start)
+        token = self.rotate(checkpoint_id)
+        stale = [seq for seq, _ in segments if seq < (token if start is None else start)]
+        if stale:
+            print(f"[Journal] Dropped {len(stale)} segments that predate the checkpoint")
+        self.compact(token if start is None else start)
+        return replayed
+
+    def close(self):
+        if not self.running:
+            return
+        self.running = False
+        self.wake.set()
+        self.thread.join()
+        self.flush()
+        self._close_file()
+        atexit.unregister(self.close)
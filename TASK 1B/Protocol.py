@@ -0,0 +1,154 @@
+import struct
+import json
+
+# =====================================================
+# Compact binary framing for the wrapper protocol
+# =====================================================
+# Every binary frame is a 4-byte header followed by a fixed payload:
+#
+#   version (u8) | message type (u8) | payload length (u16) | payload
+#
+# All values are little-endian. A client asks for binary framing by sending
+# the JSON line HELLO_REQUEST right after connecting; the peer switches to
+# binary only after answering with HELLO_ACK. A wrapper that ignores the
+# hello keeps both sides on JSON lines.
+#
+# Scenes with several robots tag sensor updates and speed commands with a
+# robot ID: a "robot" key in JSON, the MSG_ROBOT_* types in binary (robot
+# ID as a leading u8). Untagged messages address robot 0, so single-robot
+# peers are unaffected.
+
+PROTOCOL_VERSION = 1
+
+SENSOR_NAMES = ("left_corner", "left", "middle", "right", "right_corner")
+
+MSG_SENSOR_UPDATE = 1
+MSG_SET_SPEED = 2
+MSG_START_SIMULATION = 3
+MSG_STOP_SIMULATION = 4
+MSG_ROBOT_SENSOR_UPDATE = 5
+MSG_ROBOT_SET_SPEED = 6
+
+HEADER = struct.Struct("<BBH")
+SENSOR_PAYLOAD = struct.Struct("<5f")
+SET_SPEED_PAYLOAD = struct.Struct("<ffIfB")   # L, R, State, Reward, Action
+SET_SPEED_SPEEDS = struct.Struct("<ff")       # the (L, R) prefix of SET_SPEED_PAYLOAD
+SET_SPEED_TAIL = struct.Struct("<IfB")        # and the per-tick State, Reward, Action
+ROBOT_SET_SPEED_SPEEDS = struct.Struct("<Bff")
+ROBOT_SENSOR_PAYLOAD = struct.Struct("<B5f")
+ROBOT_SET_SPEED_PAYLOAD = struct.Struct("<BffIfB")
+
+HELLO_REQUEST = {"command": "hello", "protocol": "binary", "version": PROTOCOL_VERSION}
+HELLO_ACK = {"type": "hello", "protocol": "binary", "version": PROTOCOL_VERSION}
+
+
+def frame_length(data, start=0):
+    """
+    Total length of the binary frame starting at data[start], or None if
+    its header has not fully arrived yet.
+    """
+    if len(data) - start < HEADER.size:
+        return None
+    _, _, length = HEADER.unpack_from(data, start)
+    return HEADER.size + length
+
+
+def is_sensor_update(frame):
+    return frame[1] == MSG_SENSOR_UPDATE or frame[1] == MSG_ROBOT_SENSOR_UPDATE
+
+
+# =====================================================
+# Encoders
+# =====================================================
+def encode_sensor_update(sensors, robot=None):
+    values = [float(sensors.get(name, 0.0)) for name in SENSOR_NAMES]
+    if robot is not None:
+        return HEADER.pack(PROTOCOL_VERSION, MSG_ROBOT_SENSOR_UPDATE, ROBOT_SENSOR_PAYLOAD.size) \
+            + ROBOT_SENSOR_PAYLOAD.pack(robot, *values)
+    return HEADER.pack(PROTOCOL_VERSION, MSG_SENSOR_UPDATE, SENSOR_PAYLOAD.size) \
+        + SENSOR_PAYLOAD.pack(*values)
+
+
+def encode_set_speed(left_speed, right_speed, state=0, reward=0, action=0, robot=None):
+    return set_speed_prefix(left_speed, right_speed, robot) + set_speed_tail(state, reward, action)
+
+
+# A set_speed message splits into a prefix that depends only on the robot
+# and its (L, R) pair, which a client can encode once per action, and a
+# short tail with the per-tick State, Reward and Action. Both framings keep
+# those three fields last, so prefix + tail is the complete message.
+def set_speed_prefix(left_speed, right_speed, robot=None):
+    if robot is not None:
+        return HEADER.pack(PROTOCOL_VERSION, MSG_ROBOT_SET_SPEED, ROBOT_SET_SPEED_PAYLOAD.size) \
+            + ROBOT_SET_SPEED_SPEEDS.pack(robot, left_speed, right_speed)
+    return HEADER.pack(PROTOCOL_VERSION, MSG_SET_SPEED, SET_SPEED_PAYLOAD.size) \
+        + SET_SPEED_SPEEDS.pack(left_speed, right_speed)
+
+
+def set_speed_tail(state=0, reward=0, action=0):
+    return SET_SPEED_TAIL.pack(int(state), reward, int(action))
+
+
+def json_set_speed_prefix(left_speed, right_speed, robot=None):
+    robot_field = "" if robot is None else f'"robot": {int(robot)}, '
+    return (f'{{"command": "set_speed", {robot_field}"L": {json.dumps(left_speed)}, '
+            f'"R": {json.dumps(right_speed)}, "State": ').encode()
+
+
+def json_set_speed_tail(state=0, reward=0, action=0):
+    if type(reward) is not int:
+        reward = float(reward)
+    return f'{int(state)}, "Reward": {reward!r}, "Action": {int(action)}}}\n'.encode()
+
+
+def encode_start_simulation():
+    return HEADER.pack(PROTOCOL_VERSION, MSG_START_SIMULATION, 0)
+
+
+def encode_stop_simulation():
+    return HEADER.pack(PROTOCOL_VERSION, MSG_STOP_SIMULATION, 0)
+
+
+def encode_json(msg):
+    return (json.dumps(msg) + "\n").encode()
+
+
+# =====================================================
+# Decoder
+# =====================================================
+def decode_message(frame):
+    """
+    Decode one complete binary frame into the same dict the JSON-line
+    protocol carries, so callers do not care which framing is in use.
+    """
+    try:
+        return _decode_message(frame)
+    except struct.error as e:
+        raise ValueError(f"truncated binary frame: {e}")
+
+
+def _decode_message(frame):
+    version, msg_type, length = HEADER.unpack_from(frame)
+    if version != PROTOCOL_VERSION:
+        raise ValueError(f"unsupported protocol version {version}")
+    if msg_type == MSG_SENSOR_UPDATE:
+        values = SENSOR_PAYLOAD.unpack_from(frame, HEADER.size)
+        return {"type": "sensor_update", "sensors": dict(zip(SENSOR_NAMES, values))}
+    if msg_type == MSG_SET_SPEED:
+        left, right, state, reward, action = SET_SPEED_PAYLOAD.unpack_from(frame, HEADER.size)
+        return {"command": "set_speed", "L": left, "R": right,
+                "State": state, "Reward": reward, "Action": action}
+    if msg_type == MSG_ROBOT_SENSOR_UPDATE:
+        robot, *values = ROBOT_SENSOR_PAYLOAD.unpack_from(frame, HEADER.size)
+        return {"type": "sensor_update", "robot": robot,
+                "sensors": dict(zip(SENSOR_NAMES, values))}
+    if msg_type == MSG_ROBOT_SET_SPEED:
+        robot, left, right, state, reward, action = \
+            ROBOT_SET_SPEED_PAYLOAD.unpack_from(frame, HEADER.size)
+        return {"command": "set_speed", "robot": robot, "L": left, "R": right,
+                "State": state, "Reward": reward, "Action": action}
+    if msg_type == MSG_START_SIMULATION:
+        return {"command": "start_simulation"}
+    if msg_type == MSG_STOP_SIMULATION:
+        return {"command": "stop_simulation"}
+    raise ValueError(f"unknown message type {msg_type}")
@@ -1,126 +1,314 @@
 import numpy as np
 import random
-import pickle
 import os
+import uuid
+
+import Checkpoint
+from StateEncoder import DEFAULT_STATE_SPEC
+
+# Wheel speeds (L, R) per action ID, in action_list order
+ACTION_SPEEDS = [(2.0, 2.0),    # forward
+                 (1.0, 2.5),    # left
+                 (2.5, 1.0),    # right
+                 (0.5, 2.5),    # sharp left
+                 (2.5, 0.5)]    # sharp right
+
+# Reward per 5-bit sensor state; every other state earns REWARD_LOST
+REWARD_GROUPS = [((0b00100, 0b01100, 0b00110), 20),     # centered
+                 ((0b11100, 0b01110, 0b00111), 10),     # near curve
+                 ((0b00010, 0b00001, 0b10000), -5)]     # edge
+REWARD_LOST = -20
 
 
 class QLearningController:
-    def __init__(self, n_states=0, n_actions=0, filename="q_table.pkl"):
+    def __init__(self, n_states=0, n_actions=0, filename="q_table.ckpt", state_spec=None):
         """
         Initialize the Q-learning controller.
+
+        The number of states follows from state_spec (default: the five
+        line sensors thresholded at 0.3, 32 states). n_states may be left
+        at 0; a non-zero value that disagrees with the spec is an error.
+        A legacy filename ending in .pkl is read once and migrated to the
+        .ckpt checkpoint format next to it.
         """
+        self.state_spec = state_spec or DEFAULT_STATE_SPEC
+        self.encoder = self.state_spec.compile()
+        if n_states and n_states != self.encoder.n_states:
+            raise ValueError(f"n_states={n_states} does not match the state spec "
+                             f"({self.encoder.n_states} states)")
+        n_states = self.encoder.n_states
         self.n_states = n_states
         self.n_actions = n_actions
-        self.filename = filename
+        self.filename = Checkpoint.checkpoint_path(filename)
+        self.legacy_filename = os.path.splitext(self.filename)[0] + Checkpoint.LEGACY_SUFFIX
+        self.last_action = 0    # fed back into the state when the spec asks for it
+        self.iteration = 0      # update_q_table calls, tags journal records
+        # Optional Journal.UpdateJournal; records every Q-value written
+        self.journal = None
 
         # Learning parameters
         self.lr = 0.44      # learning rate
         self.gamma = 0.89   # discount factor
         self.epsilon = 0.3  # exploration rate
+        # Optional Exploration.ExplorationScheduler; replaces epsilon-greedy
+        self.exploration = None
 
         # Q-table
         self.q_table = np.zeros((n_states, n_actions))
 
         # Action list
         self.action_list = ["forward", "left", "right", "sharp_left", "sharp_right"]
-        self.actions = {}
+        self.actions = {name: idx for idx, name in enumerate(self.action_list)}
+
+        # Lookup tables for the integer-action hot path. The list forms give
+        # plain Python numbers for the per-step methods, the arrays serve
+        # batched code.
+        self.speed_pairs = list(ACTION_SPEEDS)
+        self.speed_table = np.array(ACTION_SPEEDS, dtype=np.float64)
+        # Rewards are defined on the sensor bits, so states that also carry
+        # the previous action share the reward of their sensor code
+        rewards = {code: reward for group, reward in REWARD_GROUPS for code in group}
+        sensor_rewards = [rewards.get(self._five_sensor_code(code), REWARD_LOST)
+                          for code in range(self.state_spec.n_sensor_codes)]
+        self.reward_values = [sensor_rewards[self.encoder.sensor_code(s)]
+                              for s in range(n_states)]
+        self.reward_table = np.array(self.reward_values, dtype=np.float64)
 
     # =====================================================
     # Line follower logic (for white line on black background)
     # =====================================================
     def Get_state(self, sensor_data):
         """
-        Convert sensor readings [left, center, right] (1=white, 0=black) to state ID.
+        Convert a sensor_update dict to a state ID with the compiled state
+        spec. For the default spec this is the 5-bit code
+        left_corner, left, middle, right, right_corner (1 = reading > 0.3).
         """
-        lc = 1 if sensor_data['left_corner'] > 0.3 else 0
-        l  = 1 if sensor_data['left'] > 0.3 else 0
-        m  = 1 if sensor_data['middle'] > 0.3 else 0
-        r  = 1 if sensor_data['right'] > 0.3 else 0
-        rc = 1 if sensor_data['right_corner'] > 0.3 else 0
+        return self.encoder.encode(sensor_data, self.last_action)
 
-    # Combine into binary representation (5 bits)
-        state = (lc << 4) | (l << 3) | (m << 2) | (r << 1) | rc
-        return state
+    def _five_sensor_code(self, code):
+        """
+        The 5-bit code REWARD_GROUPS is written in for a sensor code of the
+        state spec: each bit moves to its sensor's place in the default
+        layout, so for the three-sensor spec "middle only" is 0b00100.
+        Specs with sensors outside the default layout keep their own codes.
+        """
+        sensors = self.state_spec.sensors
+        layout = DEFAULT_STATE_SPEC.sensors
+        if not set(sensors) <= set(layout):
+            return code
+        full = 0
+        for i, name in enumerate(sensors):
+            if code >> (len(sensors) - 1 - i) & 1:
+                full |= 1 << (len(layout) - 1 - layout.index(name))
+        return full
 
     def Calculate_reward(self, state):
         """
-        Reward design for white-line following.
+        Reward design for white-line following (see REWARD_GROUPS).
         """
-        if state in [0b00100, 0b01100, 0b00110]:   # centered
-            return 20
-        elif state in [0b11100, 0b01110, 0b00111]: # near curve
-            return 10
-        elif state in [0b00010, 0b00001, 0b10000]: # edge
-            return -5
-        else:
-            return -20
+        return self.reward_values[state]
 
     def update_q_table(self, state, action, reward, next_state):
         """
-        Q-learning update rule.
+        Q-learning update rule. action is an action ID (a name from
+        action_list is also accepted).
         """
-        a_idx = self.action_list.index(action)
-        current_q = self.q_table[state][a_idx]
-        max_future_q = np.max(self.q_table[next_state])
+        if isinstance(action, str):
+            action = self.actions[action]
+        self.iteration += 1
+        current_q = self.q_table[state, action]
+        max_future_q = self.q_table[next_state].max()
         new_q = current_q + self.lr * (reward + self.gamma * max_future_q - current_q)
-        self.q_table[state][a_idx] = new_q
+        self.q_table[state, action] = new_q
+        if self.journal is not None:
+            self.journal.record(self.iteration, state, action, new_q)
+
+    def update_batch(self, states, actions, rewards, next_states, dones=None, weights=None):
+        """
+        Vectorised Q-learning update for a batch of transitions.
+
+        actions are integer indices into action_list. TD targets are all
+        computed from the table as it was before the batch. A (state, action)
+        pair that appears k times ends up exactly where k sequential updates
+        towards those targets would leave it:
+            q <- (1 - lr)^k * q + sum_i lr * (1 - lr)^(k - 1 - i) * target_i
+        Transitions with done set do not bootstrap. weights, if given, scale
+        the step size of each transition to lr * weight (e.g. the
+        importance-sampling weights of prioritized replay). Returns the TD
+        errors.
+        """
+        states = np.asarray(states, dtype=np.intp)
+        actions = np.asarray(actions, dtype=np.intp)
+        rewards = np.asarray(rewards, dtype=np.float64)
+        targets = rewards + self.gamma * self.q_table[next_states].max(axis=1)
+        if dones is not None:
+            targets = np.where(dones, rewards, targets)
+        td_errors = targets - self.q_table[states, actions]
+        steps = None if weights is None else self.lr * np.asarray(weights, dtype=np.float64)
+        self._apply_targets(self.q_table, states, actions, targets, steps=steps)
+        return td_errors
+
+    def _apply_targets(self, table, states, actions, targets, table_id=0, steps=None):
+        """
+        Move table[states, actions] towards targets in the sequential
+        closed form described in update_batch. steps holds a step size per
+        transition (default: lr for all). table_id names the table in
+        journal records.
+        """
+        # Group repeated pairs, keeping batch order inside each group
+        n_actions = table.shape[1]
+        pairs = states * n_actions + actions
+        order = np.argsort(pairs, kind="stable")
+        uniq, first, counts = np.unique(pairs[order], return_index=True, return_counts=True)
+        if steps is None:
+            decay = 1.0 - self.lr
+            age = np.repeat(counts + first - 1, counts) - np.arange(len(pairs))
+            weighted = self.lr * decay ** age * targets[order]
+            kept = decay ** counts
+        else:
+            # Same closed form with step size a_i per update: target_i is
+            # weighted by a_i times the product of (1 - a_j) of the updates
+            # after it, computed as differences of a running log sum
+            alpha = np.minimum(steps[order], 1.0 - 1e-12)
+            log_keep = np.log1p(-alpha)
+            total = np.cumsum(log_keep)
+            group_total = total[first + counts - 1]
+            weighted = alpha * np.exp(np.repeat(group_total, counts) - total) * targets[order]
+            kept = np.exp(group_total - total[first] + log_keep[first])
+        rows, cols = uniq // n_actions, uniq % n_actions
+        table[rows, cols] = kept * table[rows, cols] + np.add.reduceat(weighted, first)
+        if self.journal is not None:
+            self.journal.record_batch(self.iteration, rows, cols, table[rows, cols], table_id)
 
     def choose_action(self, state):
         """
-        Epsilon-greedy action selection.
+        Epsilon-greedy action selection, or the attached exploration
+        scheduler's choice. Returns an action ID.
         """
-        if random.uniform(0, 1) < self.epsilon:
-            return random.choice(self.action_list)
+        if self.exploration is not None:
+            action = self.exploration.choose(self.q_table, state)
+        elif random.random() < self.epsilon:
+            action = random.randrange(self.n_actions)
         else:
-            best_idx = np.argmax(self.q_table[state])
-            return self.action_list[best_idx]
+            action = int(self.q_table[state].argmax())
+        self.last_action = action
+        return action
 
     def perform_action(self, action):
         """
-        Map actions to wheel speeds.
-        """
-        if action == 0:    # forward
-            return 2.0, 2.0
-        elif action == 1:  # left
-            return 1.0, 2.5
-        elif action == 2:  # right
-            return 2.5, 1.0
-        elif action == 3:  # sharp left
-            return 0.5, 2.5
-        elif action == 4:  # sharp right
-            return 2.5, 0.5
-        else:
-            left_speed = 0.0
-            right_speed = 0.0
+        Map an action ID to wheel speeds. Unknown actions stop the robot.
+        """
+        if 0 <= action < len(self.speed_pairs):
+            return self.speed_pairs[action]
+        return 0.0, 0.0
+
+    def action_name(self, action):
+        """
+        Name of an action ID, for logging.
+        """
+        return self.action_list[action]
 
-    
-            return left_speed, right_speed
-        
     # =====================================================
     # Q-table persistence
     # =====================================================
+    def _checkpoint_data(self):
+        """
+        Everything a checkpoint stores. Subclasses extend the dict.
+        """
+        return {
+            "q_table": self.q_table,
+            "epsilon": self.epsilon,
+            "n_actions": self.n_actions,
+            "n_states": self.n_states,
+            "iteration": self.iteration,
+            "exploration": self.exploration.state_dict() if self.exploration else None
+        }
+
+    def _check_checkpoint(self, data):
+        """
+        Raise ValueError if a checkpoint's table does not fit this
+        controller. One built for a number of actions only takes tables
+        with that many; one built with n_actions=0 adopts the checkpoint's.
+        """
+        self.encoder.check_table(np.asarray(data.get("q_table", self.q_table)),
+                                 self.n_actions or None)
+
+    def _restore_checkpoint(self, data):
+        self._check_checkpoint(data)
+        self.q_table = q_table = data.get("q_table", self.q_table)
+        self.epsilon = data.get("epsilon", self.epsilon)
+        self.n_actions = q_table.shape[1]
+        self.n_states = q_table.shape[0]
+        self.iteration = data.get("iteration", 0)
+        if self.exploration is not None and data.get("exploration"):
+            self.exploration.load_state_dict(data["exploration"])
+
+    def _journal_tables(self):
+        """
+        Tables journal records refer to, by table_id.
+        """
+        return [self.q_table]
+
+    def _journal_replayed(self):
+        """
+        Hook run after journal records were applied to the tables.
+        """
+
+    def _stamp_checkpoint(self, data):
+        """
+        Give a checkpoint dict a new checkpoint_id, with or without a
+        journal, so a journal never replays over a checkpoint it did not
+        build on. With a journal this starts a new segment based on the
+        ID; the checkpoint records it as journal_segment, and the older
+        segments can go once the checkpoint is written.
+        """
+        data["checkpoint_id"] = uuid.uuid4().hex
+        if self.journal is not None:
+            data["journal_segment"] = self.journal.rotate(data["checkpoint_id"])
+        return data
+
+    def checkpoint_snapshot(self):
+        """
+        Checkpoint dict detached from the live tables (for background saves).
+        """
+        return self._stamp_checkpoint(Checkpoint.snapshot(self._checkpoint_data()))
+
     def save_q_table(self):
-        with open(self.filename, "wb") as f:
-            pickle.dump({
-                "q_table": self.q_table,
-                "epsilon": self.epsilon,
-                "n_actions": self.n_actions,
-                "n_states": self.n_states
-            }, f)
-
-    def load_q_table(self):
-        if os.path.exists(self.filename):
-            with open(self.filename, "rb") as f:
-                data = pickle.load(f)
-            self.q_table = data.get("q_table", self.q_table)
-            self.epsilon = data.get("epsilon", self.epsilon)
-            self.n_actions = data.get("n_actions", self.n_actions)
-            self.n_states = data.get("n_states", self.n_states)
-            return True
-        return False
+        """
+        Write the checkpoint atomically (see Checkpoint.py).
+        """
+        data = self._stamp_checkpoint(self._checkpoint_data())
+        Checkpoint.write_checkpoint(self.filename, data)
+        if self.journal is not None:
+            self.journal.compact(data["journal_segment"])
+
+    def load_q_table(self, mmap=False):
+        """
+        Load the checkpoint, migrating a legacy pickle first if only that
+        exists, then replay the journal (if attached) on top of it. With
+        mmap=True and no journal the Q-table is a read-only view of the file
+        (no copy), for processes that only act on it. On Windows it is a
+        copy, as a mapped checkpoint could not be replaced by a trainer.
+        """
+        if not os.path.exists(self.filename) and os.path.exists(self.legacy_filename):
+            Checkpoint.migrate_pickle(self.legacy_filename, self.filename,
+                                      check=self._check_checkpoint)
+        loaded = os.path.exists(self.filename)
+        checkpoint_id = ""
+        if loaded:
+            data = Checkpoint.read_checkpoint(self.filename, mmap=mmap and self.journal is None)
+            self._restore_checkpoint(data)
+            checkpoint_id = data.get("checkpoint_id", "")
+        if self.journal is not None:
+            replayed, last_iteration = self.journal.recover(self._journal_tables(), checkpoint_id)
+            if replayed:
+                self._journal_replayed()
+                self.iteration = max(self.iteration, last_iteration)
+                loaded = True
+        return loaded
 
 
 # Optional test block (safe to remove in deployment)
 if __name__ == "__main__":
-    agent = QLearningController(n_states=8, n_actions=5)
+    agent = QLearningController(n_actions=5)
     print("✅ tune.py loaded successfully — no indentation errors!")
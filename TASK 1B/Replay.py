@@ -0,0 +1,158 @@
+import numpy as np
+
+# =====================================================
+# Experience replay
+# =====================================================
+# Transitions are stored column-wise in preallocated arrays with compact
+# dtypes, written in ring order. Sampling is uniform, or proportional to
+# |TD error|^alpha through a sum-tree when prioritized is set. Sampled
+# batches go straight into QLearningController.update_batch().
+
+
+class SumTree:
+    """
+    Binary tree over a fixed number of leaves where every node holds the
+    sum of its children. Setting a leaf and drawing a leaf with
+    probability proportional to its value are both O(log n).
+    """
+    def __init__(self, capacity):
+        self.capacity = 1
+        while self.capacity < capacity:
+            self.capacity <<= 1
+        self.nodes = np.zeros(2 * self.capacity, dtype=np.float64)
+
+    def total(self):
+        return self.nodes[1]
+
+    def set(self, indices, values):
+        """
+        Set leaves (arrays of leaf indices and values) and refresh the sums
+        above them.
+        """
+        idx = np.asarray(indices) + self.capacity
+        self.nodes[idx] = values
+        idx = np.unique(idx >> 1)
+        while idx[0] >= 1:
+            self.nodes[idx] = self.nodes[2 * idx] + self.nodes[2 * idx + 1]
+            if idx[0] == 1:
+                break
+            idx = np.unique(idx >> 1)
+
+    def get(self, indices):
+        return self.nodes[np.asarray(indices) + self.capacity]
+
+    def find(self, targets):
+        """
+        Leaf index for each target mass in [0, total), descending all
+        targets through the tree together.
+        """
+        idx = np.ones(len(targets), dtype=np.int64)
+        targets = np.array(targets, dtype=np.float64)
+        while idx[0] < self.capacity:
+            left = 2 * idx
+            left_sum = self.nodes[left]
+            go_right = targets >= left_sum
+            targets -= np.where(go_right, left_sum, 0.0)
+            idx = left + go_right
+        return idx - self.capacity
+
+
+class ReplayBuffer:
+    def __init__(self, capacity, prioritized=False, alpha=0.6, beta=0.4,
+                 eps=1e-3, seed=None):
+        """
+        capacity:    number of transitions kept (oldest are overwritten)
+        prioritized: sample proportionally to (|TD error| + eps)^alpha
+        beta:        importance-sampling exponent for prioritized batches
+        """
+        self.capacity = capacity
+        self.states = np.zeros(capacity, dtype=np.uint16)
+        self.actions = np.zeros(capacity, dtype=np.uint8)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros(capacity, dtype=np.uint16)
+        self.dones = np.zeros(capacity, dtype=np.bool_)
+        self.pos = 0
+        self.size = 0
+
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.beta = beta
+        self.eps = eps
+        self.tree = SumTree(capacity) if prioritized else None
+        self.max_priority = 1.0
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state, action, reward, next_state, done=False):
+        """
+        Store one transition in O(1) (O(log n) when prioritized). New
+        transitions get the highest priority seen so far.
+        """
+        i = self.pos
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+        if self.tree is not None:
+            self.tree.set([i], [self.max_priority])
+        self.pos = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def add_batch(self, states, actions, rewards, next_states, dones=None):
+        n = len(states)
+        idx = (self.pos + np.arange(n)) % self.capacity
+        self.states[idx] = states
+        self.actions[idx] = actions
+        self.rewards[idx] = rewards
+        self.next_states[idx] = next_states
+        self.dones[idx] = False if dones is None else dones
+        if self.tree is not None:
+            self.tree.set(idx, np.full(n, self.max_priority))
+        self.pos = int((self.pos + n) % self.capacity)
+        self.size = min(self.size + n, self.capacity)
+
+    def sample(self, batch_size):
+        """
+        Draw a batch. Returns (indices, states, actions, rewards,
+        next_states, dones, weights); weights are the normalised
+        importance-sampling weights (all 1 for uniform sampling).
+        """
+        if self.tree is None:
+            idx = self.rng.integers(0, self.size, batch_size)
+            weights = np.ones(batch_size)
+        else:
+            # One draw per equal slice of the total mass
+            total = self.tree.total()
+            bounds = (np.arange(batch_size) + self.rng.random(batch_size)) * (total / batch_size)
+            idx = np.minimum(self.tree.find(bounds), self.size - 1)
+            probs = self.tree.get(idx) / total
+            weights = (self.size * probs) ** -self.beta
+            weights /= weights.max()
+        return (idx, self.states[idx], self.actions[idx], self.rewards[idx],
+                self.next_states[idx], self.dones[idx], weights)
+
+    def update_priorities(self, indices, td_errors):
+        if self.tree is None:
+            return
+        priorities = (np.abs(td_errors) + self.eps) ** self.alpha
+        self.tree.set(indices, priorities)
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+
+    def replay(self, controller, batch_size=64, updates=1):
+        """
+        Run a number of batched Q-updates from the buffer and feed the new
+        TD errors back as priorities. Prioritized samples are applied with
+        their importance-sampling weights, correcting the bias of drawing
+        large TD errors more often. Returns the number of transitions
+        replayed.
+        """
+        if self.size == 0:
+            return 0
+        for _ in range(updates):
+            idx, s, a, r, ns, d, w = self.sample(batch_size)
+            td_errors = controller.update_batch(s, a, r, ns, d, None if self.tree is None else w)
+            self.update_priorities(idx, td_errors)
+        return updates * batch_size
@@ -0,0 +1,162 @@
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+# =====================================================
+# Shared, live Q-table
+# =====================================================
+# A trainer publishes its Q-table into a small memory-mapped file; any
+# number of test/evaluation processes map the same file and act greedily on
+# whatever was published last, without copying, pickling or reloading.
+# Put the file on a tmpfs (e.g. /dev/shm on Linux) to keep it off the disk.
+#
+# Layout:
+#     0    HEADER: magic, layout version, n_states, n_actions
+#     16   generation (uint64), odd while a publish is in progress
+#     64   float64 Q-values, C order
+#
+# The generation counter is a seqlock: a reader notes it, reads, and
+# retries if it was odd or has changed, so it never acts on a half-written
+# table while the writer never waits for readers. Readers spin briefly, then
+# back off; a counter left odd for STALL_TIMEOUT means the writer died
+# mid-publish, and the table (which will not change any more) is read as
+# it is.
+
+MAGIC = b"EYQL"
+LAYOUT_VERSION = 1
+HEADER = "<4sIII"
+GENERATION_OFFSET = 16
+DATA_OFFSET = 64
+SPIN_LIMIT = 100        # busy retries before a reader sleeps between retries
+STALL_TIMEOUT = 0.1     # seconds a publish may take before its writer is presumed dead
+
+
+class SharedQTable:
+    def __init__(self, path, mm, writable):
+        self.path = path
+        self.mm = mm
+        self.writable = writable
+        magic, version, n_states, n_actions = struct.unpack_from(HEADER, mm, 0)
+        if magic != MAGIC or version != LAYOUT_VERSION:
+            raise ValueError(f"{path}: not a live Q-table")
+        self.shape = (n_states, n_actions)
+        self.n_states, self.n_actions = n_states, n_actions
+        self.generation = np.ndarray((1,), dtype=np.uint64, buffer=mm, offset=GENERATION_OFFSET)
+        self.table = np.ndarray(self.shape, dtype=np.float64, buffer=mm, offset=DATA_OFFSET)
+        self.stalled = None     # generation a dead writer left odd, once detected
+
+    @classmethod
+    def create(cls, path, shape):
+        """
+        Trainer side: map path for publishing a table of the given shape.
+        A compatible existing file is reused so attached readers keep
+        following it (a publish a previous writer left half done is
+        closed); otherwise a fresh one is swapped in atomically.
+        """
+        size = DATA_OFFSET + 8 * shape[0] * shape[1]
+        try:
+            with open(path, "r+b") as f:
+                mm = mmap.mmap(f.fileno(), 0)
+            try:
+                table = cls(path, mm, writable=True)
+                if table.shape == tuple(shape):
+                    if table.generation[0] & 1:
+                        table.generation[0] += 1
+                    return table
+            except (ValueError, struct.error):
+                pass
+            mm.close()
+        except (FileNotFoundError, ValueError):
+            pass
+
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(struct.pack(HEADER, MAGIC, LAYOUT_VERSION, shape[0], shape[1]))
+            f.truncate(size)
+        os.replace(tmp, path)
+        with open(path, "r+b") as f:
+            mm = mmap.mmap(f.fileno(), 0)
+        return cls(path, mm, writable=True)
+
+    @classmethod
+    def attach(cls, path):
+        """
+        Reader side: map an existing live table read-only. Raises
+        FileNotFoundError if no trainer has published one yet.
+        """
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(path, mm, writable=False)
+
+    # =====================================================
+    # Writer
+    # =====================================================
+    def publish(self, q_table):
+        """
+        Make q_table the current policy (one copy into the mapping).
+        """
+        self.generation[0] += 1
+        self.table[...] = q_table
+        self.generation[0] += 1
+
+    # =====================================================
+    # Readers
+    # =====================================================
+    def greedy_action(self, state):
+        """
+        Best action of a state in the latest consistent table.
+        """
+        before = int(self.generation[0])
+        if not before & 1:
+            action = int(self.table[state].argmax())
+            if int(self.generation[0]) == before:
+                return action
+        return self._read_consistent(lambda: int(self.table[state].argmax()))[0]
+
+    def snapshot(self):
+        """
+        Consistent copy of the whole table and its generation.
+        """
+        return self._read_consistent(self.table.copy)
+
+    def _read_consistent(self, read):
+        """
+        Seqlock read loop: (read(), generation) from a table no publish was
+        touching. Spins SPIN_LIMIT times, then sleeps between retries.
+        """
+        generation = self.generation
+        spins = 0
+        deadline = None
+        while True:
+            before = int(generation[0])
+            if before == self.stalled:
+                return read(), before
+            if not before & 1:
+                value = read()
+                if int(generation[0]) == before:
+                    return value, before
+            spins += 1
+            if spins < SPIN_LIMIT:
+                continue
+            now = time.monotonic()
+            if deadline is None:
+                deadline = now + STALL_TIMEOUT
+            elif now >= deadline and before & 1:
+                self.stalled = before
+                print(f"[SharedQTable] Publish in {self.path} never finished "
+                      f"(writer died?); reading the table as it is")
+            time.sleep(0.0001)
+
+    def version(self):
+        """
+        Number of publishes so far (changes whenever the policy does).
+        """
+        return int(self.generation[0]) // 2
+
+    def close(self):
+        # Drop the numpy views before unmapping
+        self.generation = self.table = None
+        self.mm.close()
@@ -0,0 +1,301 @@
+'''
+Headless stand-in for CoppeliaSim + the wrapper on port 50002.
+
+Speaks the same JSON-line protocol as Connector.CoppeliaClient (and the
+binary protocol from Protocol.py when the client asks for it), driving a
+differential-drive kinematic model along a Track. Train.py and Test.py run
+against it in real time unchanged; with --speedup 0 the simulator steps
+only on commands, so start them with --lockstep to send one every tick:
+
+    python Simulator.py                  # real time, port 50002
+    python Simulator.py --speedup 0      # one step per set_speed; python Train.py --lockstep
+    python Simulator.py --speedup 0 --idle-step   # also steps when commands are skipped
+                                                  # (timing dependent, not reproducible)
+    python Simulator.py --track my_track.json --speedup 10
+    python Simulator.py --robots 8       # 8 robots, robot-tagged messages
+'''
+import argparse
+import json
+import math
+import selectors
+import socket
+import threading
+import time
+
+import Protocol
+from Connector import FrameBuffer
+from Track import Track
+
+SENSOR_NAMES = Protocol.SENSOR_NAMES
+
+
+class LineFollowerModel:
+    def __init__(self, track, wheel_radius=0.03, wheel_base=0.12,
+                 sensor_forward=0.05, sensor_spacing=0.015, off_track_distance=0.08,
+                 field=None):
+        """
+        Differential-drive robot with five reflectance sensors on a bar
+        sensor_forward ahead of the axle, sensor_spacing apart, ordered
+        left_corner .. right_corner. Wheel speeds are in rad/s as sent in
+        set_speed commands. If a Track.DistanceField is given, sensors and
+        the off-track test read from it instead of the line geometry.
+        """
+        self.track = track
+        self.surface = field or track
+        self.wheel_radius = wheel_radius
+        self.wheel_base = wheel_base
+        self.sensor_forward = sensor_forward
+        # Lateral offsets, positive to the left of the robot
+        self.sensor_offsets = [2 * sensor_spacing, sensor_spacing, 0.0,
+                               -sensor_spacing, -2 * sensor_spacing]
+        self.off_track_distance = off_track_distance
+        self.reset()
+
+    def reset(self):
+        self.x, self.y, self.heading = self.track.start_pose()
+        self.steps = 0
+
+    def step(self, left_speed, right_speed, dt):
+        """
+        Advance the robot by dt seconds with exact arc integration.
+        """
+        v = self.wheel_radius * (left_speed + right_speed) / 2
+        w = self.wheel_radius * (right_speed - left_speed) / self.wheel_base
+        if abs(w) < 1e-9:
+            self.x += v * dt * math.cos(self.heading)
+            self.y += v * dt * math.sin(self.heading)
+        else:
+            new_heading = self.heading + w * dt
+            self.x += v / w * (math.sin(new_heading) - math.sin(self.heading))
+            self.y -= v / w * (math.cos(new_heading) - math.cos(self.heading))
+            self.heading = math.atan2(math.sin(new_heading), math.cos(new_heading))
+        self.steps += 1
+
+    def sensors(self):
+        c, s = math.cos(self.heading), math.sin(self.heading)
+        fx = self.x + self.sensor_forward * c
+        fy = self.y + self.sensor_forward * s
+        return {name: self.surface.reflectance(fx - off * s, fy + off * c)
+                for name, off in zip(SENSOR_NAMES, self.sensor_offsets)}
+
+    def off_track(self):
+        return self.surface.distance(self.x, self.y) > self.off_track_distance
+
+
+class SimulatorServer:
+    def __init__(self, host='127.0.0.1', port=50002, track=None, dt=0.05,
+                 speedup=1.0, idle_timeout=0.005, resolution=None, verbose=False,
+                 robots=1, idle_step=False):
+        """
+        dt:           simulated seconds per step (the wrapper's 20 Hz tick)
+        speedup:      steps run at speedup x real time; 0 steps exactly once
+                      per tick in which every robot sent a set_speed, so a
+                      run is reproducible (clients send every command:
+                      force=True, or CoppeliaClient(keepalive=0) as
+                      Train.py --lockstep does)
+        idle_step:    with speedup 0, also step after idle_timeout without
+                      a full set of commands, for clients that skip
+                      unchanged ones (CoppeliaClient's keepalive); when
+                      those steps happen depends on timing
+        resolution:   grid step (m) of a cached distance field to sample the
+                      sensors from; None uses the exact line geometry
+        robots:       robots in the scene; with more than one, every sensor
+                      update carries a robot ID and set_speed commands
+                      address robots by ID
+        """
+        self.host = host
+        self.port = port
+        track = track or Track.oval()
+        field = track.distance_field(resolution) if resolution else None
+        self.models = [LineFollowerModel(track, field=field) for _ in range(robots)]
+        self.model = self.models[0]
+        self.dt = dt
+        self.speedup = speedup
+        self.idle_timeout = idle_timeout
+        self.idle_step = idle_step
+        self.verbose = verbose
+        self.listener = None
+        self.stopping = False
+        self.episodes = 0
+
+    def bind(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((self.host, self.port))
+        self.listener.listen(1)
+        self.listener.settimeout(0.5)
+        self.port = self.listener.getsockname()[1]
+        return self.port
+
+    def serve_forever(self):
+        if self.listener is None:
+            self.bind()
+        print(f"[Simulator] Listening on {self.host}:{self.port}")
+        while not self.stopping:
+            try:
+                conn, addr = self.listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            print(f"[Simulator] Client connected from {addr}")
+            try:
+                self._serve_client(conn)
+            finally:
+                conn.close()
+        self.listener.close()
+
+    def start_in_thread(self):
+        """
+        Serve from a daemon thread (port 0 picks a free port). Returns the
+        port clients should connect to.
+        """
+        port = self.bind()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return port
+
+    def shutdown(self):
+        self.stopping = True
+
+    # =====================================================
+    # Session
+    # =====================================================
+    def _encode_sensors(self, binary):
+        """
+        Sensor updates of all robots, as one buffer for a single send.
+        """
+        if len(self.models) == 1:
+            sensors = self.model.sensors()
+            if binary:
+                return Protocol.encode_sensor_update(sensors)
+            return Protocol.encode_json({"type": "sensor_update", "sensors": sensors})
+        if binary:
+            return b"".join(Protocol.encode_sensor_update(model.sensors(), robot)
+                            for robot, model in enumerate(self.models))
+        return b"".join(Protocol.encode_json({"type": "sensor_update", "robot": robot,
+                                              "sensors": model.sensors()})
+                        for robot, model in enumerate(self.models))
+
+    def _reset_all(self):
+        for model in self.models:
+            model.reset()
+
+    def _serve_client(self, conn):
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        selector = selectors.DefaultSelector()
+        selector.register(conn, selectors.EVENT_READ)
+        frames = FrameBuffer()
+        n_robots = len(self.models)
+        speeds = [(0.0, 0.0)] * n_robots
+        commanded = set()           # robots with a command since the last step
+        first_command = 0.0
+        running = True
+        self._reset_all()
+        period = self.dt / self.speedup if self.speedup else None
+        next_tick = time.monotonic()
+        started = last_step = time.monotonic()
+        total_steps = 0
+
+        conn.sendall(self._encode_sensors(frames.binary))
+        try:
+            while not self.stopping:
+                if period is not None:
+                    timeout = max(0.0, next_tick - time.monotonic())
+                else:
+                    # Without idle stepping only wake up to notice shutdown()
+                    timeout = self.idle_timeout if self.idle_step else 0.1
+                if selector.select(timeout):
+                    if not frames.recv_from(conn):
+                        break
+                    for frame in frames.frames():
+                        try:
+                            msg = Protocol.decode_message(frame) if frames.binary else json.loads(frame)
+                        except ValueError as e:
+                            print(f"[Simulator] Dropping malformed frame: {e}")
+                            continue
+                        command = msg.get("command")
+                        if msg == Protocol.HELLO_REQUEST:
+                            conn.sendall(Protocol.encode_json(Protocol.HELLO_ACK))
+                            frames.set_binary()
+                        elif command == "set_speed":
+                            robot = int(msg.get("robot", 0))
+                            if not 0 <= robot < n_robots:
+                                print(f"[Simulator] Dropping command for unknown robot {robot}")
+                                continue
+                            speeds[robot] = (float(msg["L"]), float(msg["R"]))
+                            if not commanded:
+                                first_command = time.monotonic()
+                            commanded.add(robot)
+                        elif command == "start_simulation":
+                            running = True
+                            self._reset_all()
+                        elif command == "stop_simulation":
+                            running = False
+                            self._reset_all()
+                            speeds = [(0.0, 0.0)] * n_robots
+                if period is None:
+                    # Step once every robot has its command for this tick (with
+                    # idle_step, also when idle_timeout passed without them)
+                    waiting_since = first_command if commanded else last_step
+                    if len(commanded) < n_robots and not (
+                            self.idle_step and time.monotonic() - waiting_since >= self.idle_timeout):
+                        continue
+                else:
+                    now = time.monotonic()
+                    if now < next_tick:
+                        continue
+                    # Do not try to catch up after a long stall
+                    next_tick = max(next_tick + period, now - period)
+                if not running:
+                    continue
+
+                commanded.clear()
+                for robot, model in enumerate(self.models):
+                    model.step(*speeds[robot], self.dt)
+                    if model.off_track():
+                        self.episodes += 1
+                        if self.verbose:
+                            print(f"[Simulator] Robot {robot} off track after {model.steps} steps, "
+                                  f"resetting")
+                        model.reset()
+                total_steps += 1
+                last_step = time.monotonic()
+                conn.sendall(self._encode_sensors(frames.binary))
+        except OSError as e:
+            print(f"[Simulator] Connection error: {e}")
+        finally:
+            selector.close()
+        elapsed = time.monotonic() - started
+        print(f"[Simulator] Client disconnected after {total_steps} steps "
+              f"({total_steps / max(elapsed, 1e-9):.0f} steps/s, {self.episodes} resets)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless line-track simulator for the Connector protocol")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=50002)
+    parser.add_argument("--track", help="JSON track file (see Track.from_dict); default is an oval")
+    parser.add_argument("--dt", type=float, default=0.05, help="simulated seconds per step")
+    parser.add_argument("--speedup", type=float, default=1.0,
+                        help="multiple of real time; 0 runs as fast as the client")
+    parser.add_argument("--resolution", type=float, default=None,
+                        help="sample sensors from a cached distance field with this grid step (m)")
+    parser.add_argument("--robots", type=int, default=1,
+                        help="robots in the scene (more than one tags messages with robot IDs)")
+    parser.add_argument("--idle-step", action="store_true",
+                        help="with --speedup 0, also step when the client skips an unchanged command")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    track = Track.load(args.track) if args.track else None
+    server = SimulatorServer(args.host, args.port, track, dt=args.dt,
+                             speedup=args.speedup, resolution=args.resolution,
+                             verbose=args.verbose, robots=args.robots, idle_step=args.idle_step)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[Simulator] Stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import operator
+
+import numpy as np
+
+# =====================================================
+# Declarative state encoding
+# =====================================================
+# A StateSpec lists which sensors make up the discrete state and where each
+# one is thresholded. compile() turns it into a StateEncoder whose tables
+# (thresholds and bit weights) drive both the per-frame and the batched
+# encoding, and which knows how many states the Q-table needs.
+#
+# State layout: one bit per sensor, the first sensor being the most
+# significant bit. With prev_action the sensor code is multiplied by
+# n_actions and the previous action ID is added:
+#
+#     state = sensor_code * n_actions + prev_action
+
+
+class StateSpec:
+    def __init__(self, sensors, thresholds=0.3, hysteresis=0.0,
+                 prev_action=False, n_actions=5):
+        """
+        sensors:     sensor names, most significant bit first
+        thresholds:  one value for all sensors or one per sensor; a reading
+                     above it sets the bit
+        hysteresis:  dead band (one value or one per sensor). A bit turns on
+                     above threshold + hysteresis, off at or below
+                     threshold - hysteresis, and keeps its previous value
+                     in between. 0 gives plain thresholding.
+        prev_action: append the previous action ID to the state
+        n_actions:   number of actions, used when prev_action is set
+        """
+        self.sensors = tuple(sensors)
+        k = len(self.sensors)
+        self.thresholds = self._per_sensor(thresholds, k)
+        self.hysteresis = self._per_sensor(hysteresis, k)
+        self.prev_action = prev_action
+        self.n_actions = n_actions
+
+    @staticmethod
+    def _per_sensor(value, k):
+        if np.ndim(value) == 0:
+            return (float(value),) * k
+        if len(value) != k:
+            raise ValueError(f"expected {k} values, got {len(value)}")
+        return tuple(float(v) for v in value)
+
+    @property
+    def n_sensor_codes(self):
+        return 1 << len(self.sensors)
+
+    @property
+    def n_states(self):
+        return self.n_sensor_codes * (self.n_actions if self.prev_action else 1)
+
+    def to_dict(self):
+        return {"sensors": list(self.sensors), "thresholds": list(self.thresholds),
+                "hysteresis": list(self.hysteresis), "prev_action": self.prev_action,
+                "n_actions": self.n_actions}
+
+    def compile(self):
+        return StateEncoder(self)
+
+
+# Five-sensor layout read by QLearningController.Get_state
+DEFAULT_STATE_SPEC = StateSpec(["left_corner", "left", "middle", "right", "right_corner"])
+
+# Three-sensor layout of the shipped q_table.pkl (8 states, 5 actions), used
+# by the Train/Test scripts that share that table
+THREE_SENSOR_STATE_SPEC = StateSpec(["left", "middle", "right"])
+
+
+class StateEncoder:
+    def __init__(self, spec):
+        self.spec = spec
+        self.n_states = spec.n_states
+        self.stride = spec.n_actions if spec.prev_action else 1
+        k = len(spec.sensors)
+
+        self.read = operator.itemgetter(*spec.sensors)
+        self.weights = tuple(1 << (k - 1 - i) for i in range(k))
+        self.on_at = tuple(t + h for t, h in zip(spec.thresholds, spec.hysteresis))
+        self.off_at = tuple(t - h for t, h in zip(spec.thresholds, spec.hysteresis))
+        self.use_hysteresis = any(spec.hysteresis)
+        # Per-frame form: (on threshold, off threshold, weight) per sensor
+        self.table = tuple(zip(self.on_at, self.off_at, self.weights))
+
+        self.weight_array = np.array(self.weights, dtype=np.int64)
+        self.on_array = np.array(self.on_at)
+        self.off_array = np.array(self.off_at)
+
+        self.code = 0           # previous sensor code (hysteresis memory)
+        self.batch_bits = None  # previous bits per row for encode_batch
+
+    def reset(self, mask=None):
+        """
+        Forget the hysteresis memory (for the rows in mask, if given).
+        """
+        if mask is None:
+            self.code = 0
+            self.batch_bits = None
+        elif self.batch_bits is not None:
+            self.batch_bits[mask] = False
+
+    def encode(self, sensor_data, prev_action=0):
+        """
+        State ID of one frame given as a dict of sensor readings.
+        """
+        values = self.read(sensor_data)
+        if len(self.table) == 1:
+            values = (values,)
+        if self.use_hysteresis:
+            code = self.code
+            for v, (on, off, w) in zip(values, self.table):
+                if v > on:
+                    code |= w
+                elif v <= off:
+                    code &= ~w
+            self.code = code
+        else:
+            code = 0
+            for v, (on, _, w) in zip(values, self.table):
+                if v > on:
+                    code |= w
+        return code * self.stride + (prev_action if self.stride > 1 else 0)
+
+    def encode_batch(self, readings, prev_actions=None):
+        """
+        State IDs of a batch: readings is an (N, n_sensors) array in spec
+        order, prev_actions an (N,) array of action IDs.
+        """
+        readings = np.asarray(readings)
+        bits = readings > self.on_array
+        if self.use_hysteresis:
+            if self.batch_bits is None or self.batch_bits.shape != bits.shape:
+                self.batch_bits = np.zeros(bits.shape, dtype=bool)
+            bits |= self.batch_bits & (readings > self.off_array)
+            self.batch_bits = bits
+        codes = bits @ self.weight_array
+        if self.stride > 1:
+            actions = 0 if prev_actions is None else np.asarray(prev_actions)
+            return codes * self.stride + actions
+        return codes
+
+    def sensor_code(self, state):
+        """
+        Sensor bits of a state ID (works on arrays too).
+        """
+        return state // self.stride
+
+    def check_table(self, q_table, n_actions=None):
+        """
+        Raise ValueError if a Q-table does not have one row per state or,
+        when n_actions is given, one column per action.
+        """
+        if q_table.ndim != 2:
+            raise ValueError(f"Q-table has shape {q_table.shape}, expected (states, actions)")
+        if q_table.shape[0] != self.n_states:
+            raise ValueError(
+                f"Q-table has {q_table.shape[0]} states but the state spec "
+                f"{list(self.spec.sensors)} needs {self.n_states}")
+        if n_actions is not None and q_table.shape[1] != n_actions:
+            raise ValueError(
+                f"Q-table has {q_table.shape[1]} actions but the controller uses {n_actions}")
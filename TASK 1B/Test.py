@@ -23,13 +23,14 @@
 '''
 '''You can Modify the this file,add more functions According to your usage.
    You are not allowed to add any external packges,Beside the included Packages.You can use Built-in Python modules.'''
-import time
 import signal
 import sys
 
 # Import required classes for simulation and Q-learning
 from Connector import CoppeliaClient      
 from Qlearning import QLearningController 
+from SharedTable import SharedQTable
+from StateEncoder import THREE_SENSOR_STATE_SPEC
 
 # Global flag to handle safe interruption (Ctrl+C)
 stop_requested = False
@@ -46,29 +47,59 @@ def signal_handler(sig, frame):
 # Register the signal handler to handle SIGINT (Ctrl+C)
 signal.signal(signal.SIGINT, signal_handler)
 
+# Run with --live to follow the Q-table a running Train.py publishes
+LIVE = "--live" in sys.argv
+
+# Run with --lockstep against "python Simulator.py --speedup 0": every
+# command is sent, even an unchanged one, so the simulator steps once per tick
+LOCKSTEP = "--lockstep" in sys.argv
+
+def attach_live_table(ql):
+    """
+    Map the live Q-table of a running trainer. Returns None (after a
+    message) if there is none or it does not fit the controller.
+    """
+    try:
+        live = SharedQTable.attach(ql.filename + ".live")
+        ql.encoder.check_table(live.table)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"[TEST] Live Q-table unavailable ({e}); using the saved checkpoint.")
+        return None
+    ql.n_actions = live.n_actions
+    print(f"[TEST] Following live Q-table {live.path}")
+    return live
+
 def main():
     global stop_requested
 
     # ===  Initialize the Q-learning controller and load the Q-table ===
-    ql = QLearningController()
-    loaded = ql.load_q_table()
-    if not loaded:
+    ql = QLearningController(state_spec=THREE_SENSOR_STATE_SPEC)  # Same state layout as Train.py
+    try:
+        loaded = ql.load_q_table(mmap=True)  # Read-only map of the checkpoint (a copy on Windows)
+    except ValueError as e:
+        print(f"[TEST] Unusable Q-table {ql.filename}: {e}. Exiting.")
+        return
+    live = attach_live_table(ql) if LIVE else None
+    if not loaded and live is None:
         print("[TEST] No Q-table found. Exiting.")
         return
+    # Test the learned policy: the checkpoint's epsilon is the trainer's
+    # starting rate (its scheduler decays it), not a rate to test with
+    ql.epsilon = 0.0
 
     # ===  Connect to the CoppeliaSim simulation environment ===
-    client = CoppeliaClient()
+    client = CoppeliaClient(keepalive=0) if LOCKSTEP else CoppeliaClient()
     client.connect()
+    client.preencode_motor_commands(ql.perform_action(a) for a in range(ql.n_actions))
 
     print("[TEST] Starting test loop...")
 
     # === Start the testing loop ===
     while not stop_requested:
         # Step Receive current sensor data from simulator
-        sensor_data = client.receive_sensor_data()
+        sensor_data = client.wait_for_sensor_data()
         if not sensor_data:
-            time.sleep(0.05)  # Wait a short time before retrying if no data
-            continue
+            continue  # No frame arrived before the timeout
 
         # Convert sensor data into a discrete state
         state = ql.Get_state(sensor_data)
@@ -77,7 +108,11 @@ def main():
         reward = ql.Calculate_reward(state)  # You can remove this line if reward is not needed in test
 
         #  Choose an action based on the current state (pure exploitation, not training)
-        action = ql.choose_action(state)
+        if live is not None:
+            action = live.greedy_action(state)  # Latest policy published by the trainer
+            ql.last_action = action
+        else:
+            action = ql.choose_action(state)  # Greedy, epsilon is 0
 
         #  Convert action into motor commands
         left_speed, right_speed = ql.perform_action(action)
@@ -85,12 +120,11 @@ def main():
         #  Send the motor command to the simulator
         client.send_motor_command(left_speed, right_speed, state=state, action=action,reward=reward)
 
-        #  Wait for a short period before next iteration (to control speed of testing)
-        time.sleep(0.05)
-
     # ===  Stop the robot and close the connection after exiting loop (Ctrl+C) ===
-    client.send_motor_command(0, 0)  # Stop the robot
+    client.send_motor_command(0, 0, force=True)  # Stop the robot
     client.close()  # Disconnect from simulator
+    if live is not None:
+        live.close()
     print("[TEST] Testing stopped.")
 
 
@@ -0,0 +1,87 @@
+from Qlearning import QLearningController
+
+
+class TraceController(QLearningController):
+    """
+    Q-learning with eligibility traces: Watkins Q(lambda) or SARSA(lambda).
+
+    Each TD error is applied to every recently visited (state, action) in
+    proportion to its trace, so a penalty for drifting off the line reaches
+    the decisions that led there within one step. Traces are replacing, decay
+    by gamma * lambda per step, and are kept in a dict of only the active
+    pairs, dropped once they fall below trace_threshold; an update costs
+    O(active traces), not O(table).
+
+    It is a drop-in replacement in the training loop: call update_q_table()
+    then choose_action() as before. In SARSA mode the update is held back
+    until choose_action() has picked the next action it bootstraps from.
+    Call end_episode() when the robot is reset. Save/load are inherited.
+    """
+    def __init__(self, n_states=0, n_actions=0, filename="q_table.ckpt", state_spec=None,
+                 mode="watkins", lam=0.8, trace_threshold=0.01):
+        super().__init__(n_states, n_actions, filename, state_spec)
+        if mode not in ("watkins", "sarsa"):
+            raise ValueError(f"unknown trace mode {mode!r}")
+        self.mode = mode
+        self.lam = lam
+        self.trace_threshold = trace_threshold
+        self.traces = {}        # (state, action) -> eligibility
+        self.pending = None     # SARSA transition waiting for its next action
+
+    def end_episode(self, final_reward=None):
+        """
+        Finish the episode: a pending SARSA transition is applied without
+        bootstrapping, and all traces are cleared.
+        """
+        if self.pending is not None:
+            state, action, reward, _ = self.pending
+            self.pending = None
+            self._apply(state, action, reward if final_reward is None else final_reward, 0.0)
+        self.traces.clear()
+
+    def update_q_table(self, state, action, reward, next_state):
+        if isinstance(action, str):
+            action = self.actions[action]
+        self.iteration += 1
+        if self.mode == "sarsa":
+            self.pending = (state, action, reward, next_state)
+            return
+        self._apply(state, action, reward, self.q_table[next_state].max())
+
+    def choose_action(self, state):
+        action = super().choose_action(state)
+        if self.mode == "sarsa":
+            if self.pending is not None:
+                prev_state, prev_action, reward, next_state = self.pending
+                self.pending = None
+                self._apply(prev_state, prev_action, reward, self.q_table[next_state, action])
+        elif self.q_table[state, action] < self.q_table[state].max():
+            # Watkins: an exploratory action breaks the greedy chain
+            self.traces.clear()
+        return action
+
+    def _apply(self, state, action, reward, bootstrap):
+        """
+        TD(lambda) step: bump the trace of (state, action), spread the TD
+        error over all active traces, then decay and prune them.
+        """
+        q = self.q_table
+        delta = reward + self.gamma * bootstrap - q[state, action]
+        traces = self.traces
+        traces[(state, action)] = 1.0
+        step = self.lr * delta
+        decay = self.gamma * self.lam
+        journal = self.journal
+        stale = []
+        for pair, e in traces.items():
+            q[pair] += step * e
+            if journal is not None:
+                journal.record(self.iteration, pair[0], pair[1], q[pair])
+            e *= decay
+            if e < self.trace_threshold:
+                stale.append(pair)
+            else:
+                traces[pair] = e
+        for pair in stale:
+            del traces[pair]
+        return delta
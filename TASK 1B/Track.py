@@ -0,0 +1,239 @@
+import hashlib
+import json
+import math
+import os
+
+import numpy as np
+
+# =====================================================
+# Line tracks for the local simulator
+# =====================================================
+# A track is a white line of constant width drawn along a polyline on a
+# black floor. Coordinates are in metres.
+
+
+class Track:
+    def __init__(self, points, closed=True, line_width=0.02, edge_blur=0.004):
+        """
+        points:     list of (x, y) vertices of the line centre
+        closed:     join the last vertex back to the first
+        line_width: width of the white line
+        edge_blur:  width of the soft edge, so readings near the border of
+                    the line fall between 0 and 1 like a real IR sensor
+        """
+        self.points = [(float(x), float(y)) for x, y in points]
+        self.closed = closed
+        self.line_width = line_width
+        self.edge_blur = edge_blur
+
+        pts = self.points + ([self.points[0]] if closed else [])
+        # Segments as (x0, y0, dx, dy, squared length)
+        self.segments = []
+        for (x0, y0), (x1, y1) in zip(pts, pts[1:]):
+            dx, dy = x1 - x0, y1 - y0
+            self.segments.append((x0, y0, dx, dy, dx * dx + dy * dy or 1e-12))
+        # Column form of the same segments for the batched queries
+        self.seg_array = np.array(self.segments).T[:, np.newaxis, :]
+
+    # =====================================================
+    # Construction
+    # =====================================================
+    @classmethod
+    def oval(cls, length=1.2, width=0.8, corner_radius=0.25, arc_points=12, **kwargs):
+        """
+        Rounded rectangle centred on the origin, driven anticlockwise.
+        """
+        hx = length / 2 - corner_radius
+        hy = width / 2 - corner_radius
+        centres = [(hx, -hy), (hx, hy), (-hx, hy), (-hx, -hy)]
+        points = []
+        for i, (cx, cy) in enumerate(centres):
+            start = -math.pi / 2 + i * math.pi / 2
+            for k in range(arc_points + 1):
+                a = start + (math.pi / 2) * k / arc_points
+                points.append((cx + corner_radius * math.cos(a), cy + corner_radius * math.sin(a)))
+        # Start in the middle of the bottom straight
+        points.insert(0, (0.0, -width / 2))
+        return cls(points, closed=True, **kwargs)
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("type") == "oval":
+            params = {k: v for k, v in data.items() if k != "type"}
+            return cls.oval(**params)
+        return cls(data["points"], closed=data.get("closed", True),
+                   line_width=data.get("line_width", 0.02),
+                   edge_blur=data.get("edge_blur", 0.004))
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename) as f:
+            return cls.from_dict(json.load(f))
+
+    def to_dict(self):
+        return {"points": self.points, "closed": self.closed,
+                "line_width": self.line_width, "edge_blur": self.edge_blur}
+
+    # =====================================================
+    # Queries
+    # =====================================================
+    def start_pose(self):
+        """
+        (x, y, heading) at the first vertex, facing along the line.
+        """
+        x0, y0, dx, dy, _ = self.segments[0]
+        return x0, y0, math.atan2(dy, dx)
+
+    def distance(self, x, y):
+        """
+        Distance from (x, y) to the centre line.
+        """
+        best = float("inf")
+        for x0, y0, dx, dy, len2 in self.segments:
+            t = ((x - x0) * dx + (y - y0) * dy) / len2
+            t = 0.0 if t < 0.0 else (1.0 if t > 1.0 else t)
+            px, py = x0 + t * dx - x, y0 + t * dy - y
+            d2 = px * px + py * py
+            if d2 < best:
+                best = d2
+        return math.sqrt(best)
+
+    def reflectance(self, x, y):
+        """
+        Sensor reading at (x, y): 1.0 on the white line, 0.0 on the floor,
+        ramping linearly across the soft edge.
+        """
+        d = self.distance(x, y) - self.line_width / 2
+        if d <= -self.edge_blur / 2:
+            return 1.0
+        if d >= self.edge_blur / 2:
+            return 0.0
+        return 0.5 - d / self.edge_blur
+
+    # =====================================================
+    # Batched queries (NumPy)
+    # =====================================================
+    def distance_array(self, xs, ys):
+        """
+        Vectorised distance(): xs and ys are arrays of the same shape.
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        px, py = xs.reshape(-1, 1), np.asarray(ys, dtype=np.float64).reshape(-1, 1)
+        x0, y0, dx, dy, len2 = self.seg_array
+        t = np.clip(((px - x0) * dx + (py - y0) * dy) / len2, 0.0, 1.0)
+        d2 = (x0 + t * dx - px) ** 2 + (y0 + t * dy - py) ** 2
+        return np.sqrt(d2.min(axis=1)).reshape(xs.shape)
+
+    def reflectance_array(self, xs, ys):
+        d = self.distance_array(xs, ys) - self.line_width / 2
+        return np.clip(0.5 - d / self.edge_blur, 0.0, 1.0)
+
+    def distance_field(self, resolution=0.001, margin=0.1, cache_dir=None):
+        """
+        Rasterised DistanceField of this track, loaded from the disk cache
+        when one exists for the same definition and resolution.
+        """
+        return DistanceField.for_track(self, resolution, margin, cache_dir)
+
+
+# =====================================================
+# Rasterised distance field
+# =====================================================
+FIELD_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".track_cache")
+
+
+class DistanceField:
+    """
+    Signed distance to the edge of the line (negative on the line) sampled
+    on a regular grid. Lookups are a bilinear interpolation of the four
+    surrounding cells, so their cost does not depend on how many segments
+    the track has. Points outside the grid read as far off the line.
+    """
+    def __init__(self, grid, origin, resolution, line_width, edge_blur):
+        self.grid = grid                    # (ny, nx) float32, may be a memmap
+        self.x0, self.y0 = origin
+        self.resolution = resolution
+        self.line_width = line_width
+        self.edge_blur = edge_blur
+        self.ny, self.nx = grid.shape
+
+    @classmethod
+    def for_track(cls, track, resolution=0.001, margin=0.1, cache_dir=None):
+        xs = [p[0] for p in track.points]
+        ys = [p[1] for p in track.points]
+        x0, y0 = min(xs) - margin, min(ys) - margin
+        nx = int(math.ceil((max(xs) + margin - x0) / resolution)) + 1
+        ny = int(math.ceil((max(ys) + margin - y0) / resolution)) + 1
+
+        key = json.dumps({"track": track.to_dict(), "resolution": resolution,
+                          "margin": margin, "version": FIELD_VERSION}, sort_keys=True)
+        digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+        cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        filename = os.path.join(cache_dir, f"track_{digest}.npy")
+
+        if os.path.exists(filename):
+            grid = np.load(filename, mmap_mode='r')
+        else:
+            grid = np.empty((ny, nx), dtype=np.float32)
+            gx = x0 + resolution * np.arange(nx)
+            for row in range(ny):
+                grid[row] = track.distance_array(gx, np.full(nx, y0 + row * resolution))
+            grid -= track.line_width / 2
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = f"{filename}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, grid)
+            os.replace(tmp, filename)
+        return cls(grid, (x0, y0), resolution, track.line_width, track.edge_blur)
+
+    def signed_distance_array(self, xs, ys):
+        """
+        Bilinear lookup of the signed edge distance for arrays of points.
+        """
+        xs = np.asarray(xs, dtype=np.float64)
+        fx = (xs - self.x0) / self.resolution
+        fy = (np.asarray(ys, dtype=np.float64) - self.y0) / self.resolution
+        inside = (fx >= 0) & (fy >= 0) & (fx < self.nx - 1) & (fy < self.ny - 1)
+        fx = np.where(inside, fx, 0.0)
+        fy = np.where(inside, fy, 0.0)
+        ix, iy = fx.astype(np.intp), fy.astype(np.intp)
+        tx, ty = fx - ix, fy - iy
+        g = self.grid
+        top = g[iy, ix] * (1 - tx) + g[iy, ix + 1] * tx
+        bottom = g[iy + 1, ix] * (1 - tx) + g[iy + 1, ix + 1] * tx
+        return np.where(inside, top * (1 - ty) + bottom * ty, np.inf)
+
+    def distance_array(self, xs, ys):
+        return self.signed_distance_array(xs, ys) + self.line_width / 2
+
+    def reflectance_array(self, xs, ys):
+        d = self.signed_distance_array(xs, ys)
+        return np.clip(0.5 - d / self.edge_blur, 0.0, 1.0)
+
+    def signed_distance(self, x, y):
+        """
+        Scalar signed_distance_array() without the array overhead, for the
+        per-step model in Simulator.py.
+        """
+        fx = (x - self.x0) / self.resolution
+        fy = (y - self.y0) / self.resolution
+        if not (0 <= fx < self.nx - 1 and 0 <= fy < self.ny - 1):
+            return math.inf
+        ix, iy = int(fx), int(fy)
+        tx, ty = fx - ix, fy - iy
+        item = self.grid.item
+        top = item(iy, ix) * (1 - tx) + item(iy, ix + 1) * tx
+        bottom = item(iy + 1, ix) * (1 - tx) + item(iy + 1, ix + 1) * tx
+        return top * (1 - ty) + bottom * ty
+
+    def distance(self, x, y):
+        return self.signed_distance(x, y) + self.line_width / 2
+
+    def reflectance(self, x, y):
+        d = self.signed_distance(x, y)
+        if d <= -self.edge_blur / 2:
+            return 1.0
+        if d >= self.edge_blur / 2:
+            return 0.0
+        return 0.5 - d / self.edge_blur
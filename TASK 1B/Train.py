@@ -23,13 +23,17 @@
 '''
 '''You can Modify the this file,add more functions According to your usage.
    You are not allowed to add any external packges,Beside the included Packages.You can use Built-in Python modules.'''
-import time
 import signal
 import sys
 
 # Import required modules for communication and Q-learning
+from Checkpoint import CheckpointService
+from Journal import UpdateJournal
+from SharedTable import SharedQTable
 from Connector import CoppeliaClient       
-from Qlearning import QLearningController 
+from DynaQ import DynaQController
+from Replay import ReplayBuffer
+from StateEncoder import THREE_SENSOR_STATE_SPEC
 
 # Flag to handle graceful shutdown when Ctrl+C is pressed
 stop_requested = False
@@ -46,6 +50,10 @@ def signal_handler(sig, frame):
 # Register the signal handler to handle SIGINT
 signal.signal(signal.SIGINT, signal_handler)
 
+# Run with --lockstep against "python Simulator.py --speedup 0": every
+# command is sent, even an unchanged one, so the simulator steps once per tick
+LOCKSTEP = "--lockstep" in sys.argv
+
 #=== Add Functions Here ===
 
 def main():
@@ -59,39 +67,63 @@ def main():
 
     # === Q-table & Training Configuration ===
     # Adjust According to Your Need.
-    N_STATES = 0         # Number of discrete states (MUST MATCH your Get_state logic)
-    N_ACTIONS = 3        # Number of actions available (must match your action_list)
+    N_ACTIONS = 5        # Number of actions available (must match your action_list, Test.py and q_table.pkl)
     #Add Other Parameter According to your logic.
     SAVE_INTERVAL = 100  # Save Q-table to disk every N iterations
+    REPLAY_CAPACITY = 50000  # Transitions kept for experience replay
+    REPLAY_BATCH = 32        # Transitions per replayed batch update
+    REPLAY_UPDATES = 4       # Batch updates run after each control tick (0 disables replay)
+    PLANNING_STEPS = 10      # Dyna-Q model updates after each control tick (0 disables planning)
 
     # === Initialize Q-learning Controller ===
-    ql = QLearningController(n_states=N_STATES, n_actions=N_ACTIONS)
-
-    # Load existing Q-table if it exists (resumes training from last session)
-    ql.load_q_table()
+    # The number of states is derived from the state spec: the three-sensor
+    # layout of the shipped q_table.pkl, which Test.py reads the same way
+    # (DynaQController is a QLearningController that also learns a model)
+    ql = DynaQController(n_actions=N_ACTIONS, state_spec=THREE_SENSOR_STATE_SPEC)
+
+    # Journal every Q-update so a crash loses at most ~1 s of training
+    ql.journal = UpdateJournal(ql.filename + ".journal")
+
+    # Load existing Q-table if it exists (resumes training from last session);
+    # journalled updates made after the last checkpoint are replayed on top
+    try:
+        ql.load_q_table()
+    except ValueError as e:
+        print(f"[TRAIN] Cannot resume from {ql.filename}: {e}")
+        print("[TRAIN] Move it away to start a fresh Q-table. Exiting.")
+        return
+    saver = CheckpointService(ql)  # Writes checkpoints off the control loop
+
+    # Publish the Q-table for live evaluation (Test.py --live)
+    live = SharedQTable.create(ql.filename + ".live", ql.q_table.shape)
+    live.publish(ql.q_table)
 
     # === Connect to the CoppeliaSim simulator ===
-    client = CoppeliaClient()
+    client = CoppeliaClient(keepalive=0) if LOCKSTEP else CoppeliaClient()
     client.connect()
+    client.preencode_motor_commands(ql.perform_action(a) for a in range(ql.n_actions))
 
     # === Training Loop Initialization ===
 
     iteration = 0             # Counts training iterations
     prev_state = None         # State before taking an action
     prev_action = None        # Action taken from prev_state
+    reward = 0                # Reward of the last transition
 
     # === Add Vriables Here ===
+    replay = ReplayBuffer(REPLAY_CAPACITY, prioritized=True)
 
     print("[TRAIN] Starting training loop...")
 
     # === Training Loop Starts Here ===
     while not stop_requested:
         #  Read sensor data from simulator
-        sensor_data = client.receive_sensor_data()
+        sensor_data, skipped = client.wait_for_latest_sensor_data()
         print(sensor_data)  # Optional: Log raw sensor input
+        if skipped:
+            print(f"[TRAIN] Skipped {skipped} stale sensor frame(s)")
         if not sensor_data:
-            time.sleep(0.05)
-            continue  # Skip iteration if sensor data is invalid
+            continue  # No frame arrived before the timeout
 
         # Convert sensor data to a discrete state
         state = ql.Get_state(sensor_data)
@@ -100,6 +132,7 @@ def main():
         if prev_state is not None and prev_action is not None:
             reward = ql.Calculate_reward(state)  # Compute reward for action taken
             ql.update_q_table(prev_state, prev_action, reward, state)  # Q-learning update
+            replay.add(prev_state, prev_action, reward, state)  # Keep it for replay
 
         # Choose next action based on current state (explore or exploit)
         action = ql.choose_action(state)
@@ -113,21 +146,32 @@ def main():
         prev_state = state
         prev_action = action
 
+        # Reuse stored experience while waiting for the next sensor frame
+        if REPLAY_UPDATES:
+            replay.replay(ql, REPLAY_BATCH, REPLAY_UPDATES)
+        if PLANNING_STEPS:
+            ql.plan(PLANNING_STEPS)
+
+        live.publish(ql.q_table)  # Readers see the updated policy right away
         iteration += 1  # Increment training step count
 
         # Save Q-table periodically
         if iteration % SAVE_INTERVAL == 0:
-            ql.save_q_table()
-            print(f"[TRAIN] Saved Q-table at iteration {iteration}")
-
-        # Control loop timing 
-        time.sleep(0.05)
+            saver.save()  # Snapshot only; the file is written in the background
+            print(f"[TRAIN] Queued Q-table save at iteration {iteration}")
 
     # === When training is interrupted (Ctrl+C) ===
-    ql.save_q_table()  # Save final Q-table before exiting
-    client.send_motor_command(0, 0)  # Stop the robot
+    saver.save()   # Save final Q-table before exiting
+    saved = saver.close()  # Wait until it is on disk
+    ql.journal.close()
+    live.close()
+    client.send_motor_command(0, 0, force=True)  # Stop the robot
     client.close()  # Disconnect from simulator
-    print("[TRAIN] Training stopped and Q-table saved.")
+    if saved:
+        print("[TRAIN] Training stopped and Q-table saved.")
+    else:
+        # The journal keeps the updates, the next run replays them
+        print(f"[TRAIN] Training stopped, but saving the Q-table failed: {saver.last_error}")
 
 
 # Script entry point
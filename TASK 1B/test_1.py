@@ -24,6 +24,8 @@ import sys
 # Import required modules
 from Connector import CoppeliaClient
 from Qlearning import QLearningController   # Ensure filename matches exactly (Qlearning.py)
+from SharedTable import SharedQTable
+from StateEncoder import THREE_SENSOR_STATE_SPEC
 
 # Global flag for safe interruption
 stop_requested = False
@@ -41,6 +43,10 @@ def signal_handler(sig, frame):
 # Register signal handler
 signal.signal(signal.SIGINT, signal_handler)
 
+# Run with --lockstep against "python Simulator.py --speedup 0": every
+# command is sent, even an unchanged one, so the simulator steps once per tick
+LOCKSTEP = "--lockstep" in sys.argv
+
 
 def main():
     global stop_requested
@@ -48,11 +54,26 @@ def main():
     # ============================================
     # Initialize Q-learning controller
     # ============================================
-    ql = QLearningController(n_states=8, n_actions=5)  # Must match Train.py setup
-    loaded = ql.load_q_table()
+    ql = QLearningController(n_actions=5, state_spec=THREE_SENSOR_STATE_SPEC)  # Must match Train.py setup
+    try:
+        loaded = ql.load_q_table(mmap=True)  # Read-only map of the checkpoint (a copy on Windows)
+    except ValueError as e:
+        print(f"[TEST] ❌ Unusable Q-table {ql.filename}: {e}")
+        return
 
-    if not loaded:
-        print("[TEST] ❌ No saved Q-table found (q_table.pkl). Train first using Train.py.")
+    # --live: act on the Q-table a running trainer publishes instead
+    live = None
+    if "--live" in sys.argv:
+        try:
+            live = SharedQTable.attach(ql.filename + ".live")
+            ql.encoder.check_table(live.table, ql.n_actions)
+            print(f"[TEST] Following live Q-table {live.path}")
+        except (FileNotFoundError, ValueError) as e:
+            live = None
+            print(f"[TEST] Live Q-table unavailable ({e}); using the saved checkpoint.")
+
+    if not loaded and live is None:
+        print("[TEST] ❌ No saved Q-table found (q_table.ckpt). Train first using Train.py.")
         return
     else:
         print("[TEST] ✅ Q-table loaded successfully. Starting test run...")
@@ -63,8 +84,9 @@ def main():
     # ============================================
     # Connect to simulator
     # ============================================
-    client = CoppeliaClient()
+    client = CoppeliaClient(keepalive=0) if LOCKSTEP else CoppeliaClient()
     client.connect()
+    client.preencode_motor_commands(ql.perform_action(a) for a in range(ql.n_actions))
     print("[TEST] Connected to CoppeliaSim successfully.")
 
     # ============================================
@@ -75,16 +97,19 @@ def main():
 
     while not stop_requested:
         # Step 1: Get sensor data
-        sensor_data = client.receive_sensor_data()
-        if not sensor_data or len(sensor_data) != 3:
-            time.sleep(0.05)
+        sensor_data = client.wait_for_sensor_data()
+        if not sensor_data:
             continue
 
         # Step 2: Determine the current state
         state = ql.Get_state(sensor_data)
 
         # Step 3: Choose best (greedy) action
-        action = ql.choose_action(state)
+        if live is not None:
+            action = live.greedy_action(state)
+            ql.last_action = action
+        else:
+            action = ql.choose_action(state)
 
         # Step 4: Convert action to motor speeds
         left_speed, right_speed = ql.perform_action(action)
@@ -93,16 +118,15 @@ def main():
         client.send_motor_command(left_speed, right_speed, state=state, action=action)
 
         # Optional: Log every few seconds
-        print(f"[TEST] Sensors: {sensor_data} | State: {state} | Action: {action}")
-
-        # Step 6: Small control delay (tune if needed)
-        time.sleep(0.05)
+        print(f"[TEST] Sensors: {sensor_data} | State: {state} | Action: {ql.action_name(action)}")
 
     # ============================================
     # Safe exit
     # ============================================
-    client.send_motor_command(0, 0)
+    client.send_motor_command(0, 0, force=True)
     client.close()
+    if live is not None:
+        live.close()
     print("[TEST] 🚦 Testing stopped. Bot halted safely.")
 
 
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The modules under test live flat in the parent directory (next to the
+# Train.py / Test.py scripts, which pytest must not collect: they connect
+# to the simulator on import).
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,224 @@
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+import Protocol
+from Connector import CoppeliaClient, FrameBuffer
+
+
+class FakeWrapper:
+    """
+    Stand-in for the CoppeliaSim wrapper: accepts connections on a local
+    port and records every JSON line it receives as (connection, message).
+    stop() takes it down so connects are refused; start() brings it back
+    on the same port.
+    """
+    def __init__(self):
+        self.port = 0
+        self.received = []
+        self.connections = 0
+        self.conn = None
+        self.start()
+
+    def start(self):
+        self.server = socket.create_server(("127.0.0.1", self.port))
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self._accept, args=(self.server,), daemon=True).start()
+
+    def _accept(self, server):
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            self.connections += 1
+            self.conn = conn
+            threading.Thread(target=self._read, args=(conn, self.connections), daemon=True).start()
+
+    def _read(self, conn, n):
+        buf = FrameBuffer()
+        while True:
+            try:
+                data = conn.recv(65536)
+            except OSError:
+                return
+            if not data:
+                return
+            buf.feed(data)
+            self.received.extend((n, json.loads(line)) for line in buf.frames())
+
+    def send(self, msg):
+        self.conn.sendall(Protocol.encode_json(msg))
+
+    def drop(self):
+        if self.conn is not None:
+            self.conn.shutdown(socket.SHUT_RDWR)
+            self.conn.close()
+
+    def stop(self):
+        self.server.shutdown(socket.SHUT_RDWR)     # wakes the blocked accept()
+        self.server.close()
+        self.drop()
+
+    def messages(self, connection):
+        return [msg for n, msg in self.received if n == connection]
+
+
+def wait_until(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+@pytest.fixture
+def wrapper():
+    w = FakeWrapper()
+    yield w
+    w.stop()
+
+
+def connected_client(wrapper, **kwargs):
+    client = CoppeliaClient(port=wrapper.port, max_reconnect_attempts=1, **kwargs)
+    client.connect()
+    assert wait_until(lambda: wrapper.connections == 1)
+    return client
+
+
+def lose_connection(client, wrapper):
+    """
+    Take the wrapper down and let the client notice, so its next send has
+    to reconnect first.
+    """
+    wrapper.stop()
+    assert wait_until(lambda: client.receive_sensor_data() is None and client.sock is None)
+    wrapper.start()
+
+
+# =====================================================
+# Reconnection
+# =====================================================
+def test_reconnect_replays_simulation_state_and_last_command(wrapper):
+    client = connected_client(wrapper)
+    client.start_simulation()
+    client.send_motor_command(2.0, 1.0, state=4, reward=20, action=1)
+    assert wait_until(lambda: len(wrapper.messages(1)) == 2)
+
+    wrapper.drop()
+    assert wait_until(lambda: client.receive_sensor_data() is None and wrapper.connections == 2)
+    assert wait_until(lambda: len(wrapper.messages(2)) == 2)
+    start, motor = wrapper.messages(2)
+    assert start == {"command": "start_simulation"}
+    assert (motor["L"], motor["R"], motor["State"]) == (2.0, 1.0, 4)
+    client.close()
+
+
+def test_stop_on_a_dead_socket_reaches_the_wrapper(wrapper):
+    client = connected_client(wrapper)
+    client.start_simulation()
+    client.sock.shutdown(socket.SHUT_WR)    # the next write fails, as on a dead link
+
+    assert client.stop_simulation()         # reconnects and replays the stop
+    assert wait_until(lambda: wrapper.messages(2))
+    time.sleep(0.1)
+    assert wrapper.messages(2) == [{"command": "stop_simulation"}]
+    client.close()
+
+
+def test_command_that_needs_a_reconnect_is_not_sent_twice(wrapper):
+    client = connected_client(wrapper)
+    lose_connection(client, wrapper)
+
+    assert client.send_motor_command(1.0, 2.5, state=3, reward=-5, action=1)
+    assert wait_until(lambda: wrapper.messages(2))
+    time.sleep(0.1)
+    (motor,) = wrapper.messages(2)
+    assert (motor["L"], motor["R"], motor["Action"]) == (1.0, 2.5, 1)
+    client.close()
+
+
+def test_receiver_thread_outlives_a_long_outage(wrapper):
+    client = connected_client(wrapper, max_backoff=0.1)
+    client.start_receiver()
+    wrapper.send({"type": "sensor_update", "sensors": {"middle": 1.0}})
+    first = client.wait_for_frame(timeout=2.0)
+    assert first is not None
+
+    wrapper.stop()
+    time.sleep(0.5)         # several failed rounds of reconnect attempts
+    wrapper.start()
+    assert wait_until(lambda: wrapper.connections == 2)
+    wrapper.send({"type": "sensor_update", "sensors": {"middle": 0.0}})
+    frame = client.wait_for_frame(first[0], timeout=2.0)
+    assert frame is not None and frame[2] == {"middle": 0.0}
+    assert client.receiver_running
+    client.close()
+
+
+# =====================================================
+# Receive paths
+# =====================================================
+def test_wait_for_sensor_data_returns_each_frame_as_it_arrives(wrapper):
+    client = connected_client(wrapper)
+    assert client.wait_for_sensor_data(timeout=0.05) is None
+    wrapper.send({"type": "note"})      # other messages are skipped
+    threading.Timer(0.1, wrapper.send, [{"type": "sensor_update", "sensors": {"middle": 1.0}}]).start()
+    started = time.monotonic()
+    assert client.wait_for_sensor_data(timeout=2.0) == {"middle": 1.0}
+    assert time.monotonic() - started < 1.0
+    client.close()
+
+
+def test_drain_mode_returns_only_the_newest_frame(wrapper):
+    client = connected_client(wrapper)
+    for i in range(5):
+        wrapper.send({"type": "sensor_update", "sensors": {"middle": i}})
+    time.sleep(0.1)
+
+    assert client.wait_for_latest_sensor_data(timeout=1.0) == ({"middle": 4}, 4)
+    assert client.frames_skipped == 4
+    assert client.wait_for_latest_sensor_data(timeout=0.05) == (None, 0)
+    client.close()
+
+
+def test_receiver_ring_keeps_the_newest_frames_in_order(wrapper):
+    client = connected_client(wrapper)
+    client.start_receiver(capacity=4)
+    for i in range(6):
+        wrapper.send({"type": "sensor_update", "sensors": {"middle": i}})
+    assert wait_until(lambda: (client.latest() or (0, 0, None))[2] == {"middle": 5})
+
+    frames = client.since(-1)
+    assert [(seq, sensors["middle"]) for seq, _, sensors in frames] == [(2, 2), (3, 3), (4, 4), (5, 5)]
+    stamps = [stamp for _, stamp, _ in frames]
+    assert stamps == sorted(stamps) and stamps[-1] <= time.monotonic()
+    assert client.wait_for_frame(5, timeout=0.05) is None
+    client.close()
+
+
+# =====================================================
+# Multi-robot sessions
+# =====================================================
+def test_robot_frames_are_demultiplexed_and_commands_sent_together(wrapper):
+    client = connected_client(wrapper)
+    msgs = [{"type": "sensor_update", "robot": robot, "sensors": {"middle": robot}}
+            for robot in (0, 1, 2)]
+    msgs.append({"type": "sensor_update", "robot": 1, "sensors": {"middle": 10}})
+    wrapper.conn.sendall(b"".join(Protocol.encode_json(m) for m in msgs))
+
+    frames = client.wait_for_robot_frames(robots=[0, 1, 2], timeout=2.0)
+    assert frames == {0: {"middle": 0}, 1: {"middle": 10}, 2: {"middle": 2}}
+    assert client.frames_skipped == 1
+
+    for robot in (0, 1, 2):
+        client.queue_motor_command(robot, 2.0, 2.0, action=0)
+    client.queue_motor_command(1, 1.0, 2.5, action=1)      # replaces robot 1's
+    assert client.flush_motor_commands() == 3
+    assert wait_until(lambda: len(wrapper.messages(1)) == 3)
+    assert [(m["robot"], m["L"]) for m in wrapper.messages(1)] == [(0, 2.0), (1, 1.0), (2, 2.0)]
+    client.close()
@@ -0,0 +1,130 @@
+import json
+
+import pytest
+
+import Protocol
+from Connector import CoppeliaClient, FrameBuffer
+from Simulator import SimulatorServer
+
+
+def feed_in_pieces(buf, data, size):
+    frames = []
+    for i in range(0, len(data), size):
+        buf.feed(data[i:i + size])
+        frames.extend(buf.frames())
+    return frames
+
+
+# =====================================================
+# JSON lines
+# =====================================================
+def test_utf8_character_split_across_reads():
+    line = json.dumps({"type": "note", "text": "héllo ✓"}, ensure_ascii=False).encode() + b"\n"
+    cut = line.index("✓".encode()) + 1     # inside the 3-byte character
+    buf = FrameBuffer()
+    buf.feed(line[:cut])
+    assert list(buf.frames()) == []
+    buf.feed(line[cut:])
+    (frame,) = buf.frames()
+    assert json.loads(frame)["text"] == "héllo ✓"
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64])
+def test_json_lines_in_any_chunking(size):
+    msgs = [{"type": "sensor_update", "sensors": {"left": i / 10, "name": "ä" * i}}
+            for i in range(5)]
+    data = b"".join(Protocol.encode_json(m) for m in msgs)
+    frames = feed_in_pieces(FrameBuffer(), data, size)
+    assert [json.loads(f) for f in frames] == msgs
+
+
+def test_partial_line_is_kept_until_complete():
+    buf = FrameBuffer()
+    buf.feed(b'{"a": 1}\n{"b"')
+    assert list(buf.frames()) == [b'{"a": 1}']
+    assert len(buf) == 4
+    buf.feed(b': 2}\n')
+    assert list(buf.frames()) == [b'{"b": 2}']
+
+
+# =====================================================
+# Binary frames
+# =====================================================
+SENSORS = {"left_corner": 0.0, "left": 0.5, "middle": 1.0, "right": 0.25, "right_corner": 0.0}
+
+
+@pytest.mark.parametrize("size", [1, 3, 5, 64])
+def test_binary_frames_in_any_chunking(size):
+    data = (Protocol.encode_sensor_update(SENSORS)
+            + Protocol.encode_set_speed(2.0, -1.5, state=17, reward=10, action=3)
+            + Protocol.encode_sensor_update(SENSORS, robot=4)
+            + Protocol.encode_set_speed(1.0, 1.0, state=2, reward=-5, action=1, robot=4)
+            + Protocol.encode_start_simulation())
+    buf = FrameBuffer()
+    buf.set_binary()
+    msgs = [Protocol.decode_message(f) for f in feed_in_pieces(buf, data, size)]
+    assert msgs == [
+        {"type": "sensor_update", "sensors": SENSORS},
+        {"command": "set_speed", "L": 2.0, "R": -1.5, "State": 17, "Reward": 10.0, "Action": 3},
+        {"type": "sensor_update", "robot": 4, "sensors": SENSORS},
+        {"command": "set_speed", "robot": 4, "L": 1.0, "R": 1.0, "State": 2, "Reward": -5.0,
+         "Action": 1},
+        {"command": "start_simulation"},
+    ]
+
+
+def test_switch_to_binary_after_hello_in_the_same_read():
+    buf = FrameBuffer()
+    buf.feed(Protocol.encode_json(Protocol.HELLO_ACK) + Protocol.encode_sensor_update(SENSORS))
+    hello = buf.next_frame()
+    assert json.loads(hello) == Protocol.HELLO_ACK
+    buf.set_binary()
+    (frame,) = buf.frames()
+    assert Protocol.decode_message(frame)["sensors"] == SENSORS
+
+
+def test_frames_read_ahead_are_put_back():
+    buf = FrameBuffer()
+    buf.feed(b'{"b": 2}\n{"c"')
+    buf.unread(b'{"a": 1}\n')
+    assert list(buf.frames()) == [b'{"a": 1}', b'{"b": 2}']
+
+
+@pytest.mark.parametrize("protocol", ["json", "binary"])
+def test_first_sensor_frame_survives_the_handshake(protocol):
+    server = SimulatorServer(port=0, speedup=0)
+    client = CoppeliaClient(port=server.start_in_thread(), protocol=protocol)
+    try:
+        client.connect()
+        assert client.buffer.binary == (protocol == "binary")
+        sensors, _ = client.wait_for_latest_sensor_data(timeout=2.0)
+        assert sensors is not None and set(sensors) == set(SENSORS)
+    finally:
+        client.close()
+        server.shutdown()
+
+
+def test_truncated_or_unknown_binary_frames_raise_value_error():
+    with pytest.raises(ValueError):
+        Protocol.decode_message(Protocol.encode_sensor_update(SENSORS)[:10])
+    with pytest.raises(ValueError):
+        Protocol.decode_message(Protocol.HEADER.pack(Protocol.PROTOCOL_VERSION, 99, 0))
+
+
+# =====================================================
+# Encoded motor commands
+# =====================================================
+@pytest.mark.parametrize("args", [(2.0, 2.0, 5, 20, 1), (0, 0, 0, 0, 0), (1.5, -0.5, 31, -0.25, 4)])
+def test_cached_set_speed_matches_plain_encoding(args):
+    left, right, state, reward, action = args
+    client = CoppeliaClient()
+    client.preencode_motor_commands([(left, right)], robots=[2])
+    assert client._encode_motor_command(*args) == Protocol.encode_json(
+        {"command": "set_speed", "L": left, "R": right, "State": state, "Reward": reward,
+         "Action": action})
+    assert json.loads(client._encode_robot_command(2, *args))["robot"] == 2
+
+    client.buffer.binary = True
+    client.command_cache.clear()
+    assert client._encode_motor_command(*args) == Protocol.encode_set_speed(*args)
+    assert Protocol.decode_message(client._encode_robot_command(2, *args))["robot"] == 2
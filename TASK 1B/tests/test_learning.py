@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from DoubleQ import DoubleQController
+from Qlearning import QLearningController
+from Replay import ReplayBuffer
+
+
+def random_batch(rng, n, n_states=4, n_actions=2):
+    """
+    Transitions over few (state, action) pairs, so most pairs repeat.
+    """
+    return (rng.integers(0, n_states, n), rng.integers(0, n_actions, n),
+            rng.normal(size=n), rng.integers(0, 32, n), rng.random(n) < 0.1)
+
+
+def sequential(ql, q, states, actions, rewards, next_states, dones, weights=None):
+    """
+    One update at a time towards targets taken from the table before the
+    batch, which is what update_batch() promises to match.
+    """
+    q = q.copy()
+    targets = np.where(dones, rewards, rewards + ql.gamma * q[next_states].max(axis=1))
+    for i in range(len(states)):
+        step = ql.lr * (1.0 if weights is None else weights[i])
+        q[states[i], actions[i]] += step * (targets[i] - q[states[i], actions[i]])
+    return q
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_update_batch_matches_sequential_updates(seed):
+    rng = np.random.default_rng(seed)
+    ql = QLearningController(n_actions=3)
+    ql.q_table[:] = rng.normal(size=ql.q_table.shape)
+    batch = random_batch(rng, 200)
+    expected = sequential(ql, ql.q_table, *batch)
+
+    td_errors = ql.update_batch(*batch)
+
+    assert len(td_errors) == 200
+    np.testing.assert_allclose(ql.q_table, expected, atol=1e-10)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_update_batch_weights_scale_each_step(seed):
+    rng = np.random.default_rng(seed)
+    ql = QLearningController(n_actions=3)
+    ql.q_table[:] = rng.normal(size=ql.q_table.shape)
+    batch = random_batch(rng, 200)
+    weights = rng.random(200)
+    expected = sequential(ql, ql.q_table, *batch, weights=weights)
+
+    ql.update_batch(*batch, weights=weights)
+
+    np.testing.assert_allclose(ql.q_table, expected, atol=1e-10)
+
+
+def test_unit_weights_match_unweighted_update():
+    batch = random_batch(np.random.default_rng(7), 100)
+    plain, weighted = QLearningController(n_actions=3), QLearningController(n_actions=3)
+    plain.update_batch(*batch)
+    weighted.update_batch(*batch, weights=np.ones(100))
+    np.testing.assert_allclose(plain.q_table, weighted.q_table, atol=1e-12)
+
+
+def test_double_q_batch_keeps_combined_table():
+    dq = DoubleQController(n_actions=3)
+    dq.update_batch(*random_batch(np.random.default_rng(3), 64), weights=np.full(64, 0.5))
+    np.testing.assert_array_equal(dq.q_table, dq.q_a + dq.q_b)
+    assert dq.q_a.any() and dq.q_b.any()
+
+
+def test_prioritized_replay_applies_importance_weights():
+    rng = np.random.default_rng(11)
+    buf = ReplayBuffer(256, prioritized=True, seed=1)
+    buf.add_batch(*random_batch(rng, 200))
+    buf.update_priorities(np.arange(200), rng.exponential(size=200))
+
+    class Recorder(QLearningController):
+        def update_batch(self, *args, **kwargs):
+            self.seen = args[5] if len(args) > 5 else kwargs.get("weights")
+            return super().update_batch(*args, **kwargs)
+
+    ql = Recorder(n_actions=3)
+    buf.replay(ql, batch_size=32)
+    assert ql.seen is not None and ql.seen.max() == pytest.approx(1.0)
+    assert ql.seen.min() < 1.0
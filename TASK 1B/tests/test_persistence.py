@@ -0,0 +1,249 @@
+import os
+import pickle
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import Checkpoint
+from Checkpoint import CheckpointService
+from DoubleQ import DoubleQController
+from Journal import UpdateJournal
+from Qlearning import QLearningController
+from StateEncoder import THREE_SENSOR_STATE_SPEC
+
+
+def controller(path, journal=False, cls=QLearningController, n_actions=5):
+    ql = cls(n_actions=n_actions, filename=str(path))
+    if journal:
+        ql.journal = UpdateJournal(ql.filename + ".journal")
+    ql.load_q_table()
+    return ql
+
+
+def crash(ql):
+    """
+    What a killed trainer leaves on disk: the journal as of its last
+    flush, no further checkpoint.
+    """
+    ql.journal.close()
+
+
+# =====================================================
+# Checkpoints
+# =====================================================
+def test_checkpoint_round_trip(tmp_path):
+    ql = controller(tmp_path / "q.ckpt")
+    ql.q_table[:] = np.arange(ql.q_table.size).reshape(ql.q_table.shape)
+    ql.epsilon, ql.iteration = 0.07, 123
+    ql.save_q_table()
+
+    copy = controller(tmp_path / "q.ckpt")
+    np.testing.assert_array_equal(copy.q_table, ql.q_table)
+    assert (copy.epsilon, copy.iteration) == (0.07, 123)
+
+    mapped = QLearningController(filename=ql.filename)
+    assert mapped.load_q_table(mmap=True)
+    np.testing.assert_array_equal(mapped.q_table, ql.q_table)
+    assert mapped.n_actions == 5
+
+
+def test_corrupt_checkpoint_is_rejected(tmp_path):
+    ql = controller(tmp_path / "q.ckpt")
+    ql.q_table[:] = 1.0
+    ql.save_q_table()
+    with open(ql.filename, "r+b") as f:
+        f.seek(-8, os.SEEK_END)
+        f.write(b"\xff" * 8)
+    with pytest.raises(ValueError, match="checksum"):
+        controller(tmp_path / "q.ckpt")
+
+
+def test_failed_write_keeps_previous_checkpoint(tmp_path, monkeypatch):
+    ql = controller(tmp_path / "q.ckpt")
+    ql.q_table[:] = 1.0
+    ql.save_q_table()
+    ql.q_table[:] = 2.0
+
+    def crash_before_rename(src, dst):
+        raise OSError("simulated crash")
+    monkeypatch.setattr(os, "replace", crash_before_rename)
+    with pytest.raises(OSError):
+        ql.save_q_table()
+    monkeypatch.undo()
+
+    assert os.listdir(tmp_path) == ["q.ckpt"]
+    np.testing.assert_array_equal(controller(tmp_path / "q.ckpt").q_table, 1.0)
+
+
+def test_table_of_wrong_shape_is_rejected(tmp_path):
+    Checkpoint.write_checkpoint(str(tmp_path / "q.ckpt"), {"q_table": np.zeros((32, 3))})
+    with pytest.raises(ValueError, match="3 actions"):
+        controller(tmp_path / "q.ckpt", n_actions=5)
+    assert controller(tmp_path / "q.ckpt", n_actions=0).n_actions == 3
+
+
+def test_rejected_legacy_pickle_leaves_no_checkpoint(tmp_path):
+    with open(tmp_path / "q.pkl", "wb") as f:
+        pickle.dump({"q_table": np.zeros((8, 5)), "epsilon": 0.05}, f)
+    with pytest.raises(ValueError, match="8 states"):
+        controller(tmp_path / "q.pkl")
+    assert not (tmp_path / "q.ckpt").exists()
+
+
+def test_shipped_pickle_loads_with_the_three_sensor_spec(tmp_path):
+    shipped = os.path.join(os.path.dirname(os.path.dirname(__file__)), "q_table.pkl")
+    with open(shipped, "rb") as src, open(tmp_path / "q_table.pkl", "wb") as dst:
+        dst.write(src.read())
+    ql = QLearningController(n_actions=5, filename=str(tmp_path / "q_table.ckpt"),
+                             state_spec=THREE_SENSOR_STATE_SPEC)
+    assert ql.load_q_table()
+    assert ql.q_table.shape == (8, 5) and ql.epsilon == 0.05
+    assert (tmp_path / "q_table.ckpt").exists()
+    # Rewards follow the sensors, not the bit positions: "middle only" is centered
+    assert ql.Calculate_reward(0b010) == 20 and ql.Calculate_reward(0b000) == -20
+
+
+def test_checkpoint_service_stops_on_a_writer_bug(tmp_path):
+    ql = controller(tmp_path / "q.ckpt")
+    service = CheckpointService(ql)
+    assert service.save() and service.flush(5)
+
+    original = ql._checkpoint_data
+    ql._checkpoint_data = lambda: {**original(), "bad": object()}   # not JSON
+    service.save()
+    started = time.monotonic()
+    assert not service.flush(5)
+    assert service.failed and isinstance(service.last_error, TypeError)
+    assert not service.save()
+    assert not service.close()
+    assert time.monotonic() - started < 1.0
+
+
+# =====================================================
+# Journal crash recovery
+# =====================================================
+def test_journal_replays_updates_after_last_checkpoint(tmp_path):
+    ql = controller(tmp_path / "q.ckpt", journal=True)
+    rng = np.random.default_rng(0)
+    ql.update_batch(rng.integers(0, 32, 100), rng.integers(0, 5, 100), rng.normal(size=100),
+                    rng.integers(0, 32, 100))
+    ql.save_q_table()
+    for _ in range(50):
+        ql.update_q_table(int(rng.integers(32)), int(rng.integers(5)), 1.0, int(rng.integers(32)))
+    expected = ql.q_table.copy()
+    crash(ql)
+
+    recovered = controller(tmp_path / "q.ckpt", journal=True)
+    np.testing.assert_array_equal(recovered.q_table, expected)
+    assert recovered.iteration == ql.iteration
+    recovered.journal.close()
+
+
+def test_journal_recovers_across_an_unwritten_background_snapshot(tmp_path):
+    ql = controller(tmp_path / "q.ckpt", journal=True)
+    ql.save_q_table()
+    ql.update_q_table(1, 2, 5.0, 3)
+    ql.checkpoint_snapshot()        # rotated, but the process dies before writing it
+    ql.update_q_table(2, 1, 7.0, 3)
+    expected = ql.q_table.copy()
+    crash(ql)
+
+    recovered = controller(tmp_path / "q.ckpt", journal=True)
+    np.testing.assert_array_equal(recovered.q_table, expected)
+    recovered.journal.close()
+
+
+def test_journal_recovers_after_a_checkpoint_without_updates(tmp_path):
+    ql = controller(tmp_path / "q.ckpt", journal=True)
+    ql.save_q_table()               # its segment stays empty
+    ql.checkpoint_snapshot()        # never written
+    ql.update_q_table(4, 0, 3.0, 1)
+    expected = ql.q_table.copy()
+    crash(ql)
+
+    recovered = controller(tmp_path / "q.ckpt", journal=True)
+    np.testing.assert_array_equal(recovered.q_table, expected)
+    recovered.journal.close()
+
+
+def test_journal_is_not_replayed_over_a_newer_checkpoint(tmp_path):
+    ql = controller(tmp_path / "q.ckpt", journal=True)
+    ql.save_q_table()
+    ql.q_table[0, 0] = 44.0
+    ql.journal.record(1, 0, 0, 44.0)
+    crash(ql)
+
+    tool = controller(tmp_path / "q.ckpt")      # e.g. a test tool, no journal
+    tool.q_table[0, 0] = -7.0
+    tool.save_q_table()
+
+    recovered = controller(tmp_path / "q.ckpt", journal=True)
+    assert recovered.q_table[0, 0] == -7.0
+    recovered.journal.close()
+
+
+def test_torn_journal_record_is_ignored(tmp_path):
+    ql = controller(tmp_path / "q.ckpt", journal=True)
+    ql.update_q_table(3, 1, 2.0, 4)
+    expected = ql.q_table.copy()
+    crash(ql)
+    _, last = ql.journal.segments()[-1]
+    with open(last, "ab") as f:
+        f.write(b"\x01\x02\x03")    # a record cut short by the crash
+
+    recovered = controller(tmp_path / "q.ckpt", journal=True)
+    np.testing.assert_array_equal(recovered.q_table, expected)
+    recovered.journal.close()
+
+
+def test_double_q_journal_restores_both_tables(tmp_path):
+    dq = controller(tmp_path / "dq.ckpt", journal=True, cls=DoubleQController, n_actions=3)
+    dq.update_batch([1, 1, 2, 5], [0, 0, 1, 2], [1.0, 2.0, 3.0, -1.0], [3, 4, 5, 6])
+    crash(dq)
+
+    recovered = controller(tmp_path / "dq.ckpt", journal=True, cls=DoubleQController, n_actions=3)
+    np.testing.assert_array_equal(recovered.q_a, dq.q_a)
+    np.testing.assert_array_equal(recovered.q_b, dq.q_b)
+    np.testing.assert_array_equal(recovered.q_table, dq.q_table)
+    recovered.journal.close()
+
+
+def test_journal_appends_do_not_wait_for_fsync(tmp_path, monkeypatch):
+    journal = UpdateJournal(str(tmp_path / "q.journal"), fsync_interval=60)
+    journal.record(1, 0, 0, 1.0)
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: (time.sleep(0.3), real_fsync(fd)))
+    flusher = threading.Thread(target=journal.flush)
+    flusher.start()
+    time.sleep(0.05)                # the writer is inside the slow fsync
+
+    started = time.monotonic()
+    journal.record(2, 1, 0, 2.0)
+    assert time.monotonic() - started < 0.1
+    flusher.join()
+    monkeypatch.undo()
+    assert list(journal.read()["iteration"]) == [1, 2]
+    journal.close()
+
+
+def test_journal_rotate_leaves_the_file_work_to_the_writer(tmp_path, monkeypatch):
+    journal = UpdateJournal(str(tmp_path / "q.journal"), fsync_interval=60)
+    journal.record(1, 0, 0, 1.0)
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: (time.sleep(0.3), real_fsync(fd)))
+    flusher = threading.Thread(target=journal.flush)
+    flusher.start()
+    time.sleep(0.05)
+
+    started = time.monotonic()
+    token = journal.rotate("a" * 32)
+    journal.record(2, 1, 0, 2.0)
+    assert time.monotonic() - started < 0.1
+    flusher.join()
+    monkeypatch.undo()
+    journal.close()
+    segments = journal.segments()
+    assert segments[-1][0] == token
+    assert journal._segment_checkpoint(segments[-1][1]) == "a" * 32
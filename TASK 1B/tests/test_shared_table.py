@@ -0,0 +1,70 @@
+import threading
+import time
+
+import numpy as np
+
+import SharedTable
+from SharedTable import SharedQTable
+
+
+def test_readers_see_each_published_table(tmp_path):
+    path = str(tmp_path / "q.live")
+    writer = SharedQTable.create(path, (8, 5))
+    reader = SharedQTable.attach(path)
+    assert reader.shape == (8, 5) and reader.version() == 0
+
+    q = np.zeros((8, 5))
+    q[3, 4] = 1.0
+    writer.publish(q)
+    assert reader.version() == 1 and reader.greedy_action(3) == 4
+    table, generation = reader.snapshot()
+    np.testing.assert_array_equal(table, q)
+    assert generation == 2
+    reader.close()
+    writer.close()
+
+
+def test_reader_never_sees_a_half_published_table(tmp_path):
+    path = str(tmp_path / "q.live")
+    writer = SharedQTable.create(path, (64, 5))
+    reader = SharedQTable.attach(path)
+    stop = threading.Event()
+
+    def publish():
+        value = 0.0
+        while not stop.is_set():
+            value += 1.0
+            writer.publish(np.full((64, 5), value))
+
+    thread = threading.Thread(target=publish)
+    thread.start()
+    try:
+        for _ in range(200):
+            table, _ = reader.snapshot()
+            assert (table == table[0, 0]).all()
+    finally:
+        stop.set()
+        thread.join()
+    reader.close()
+    writer.close()
+
+
+def test_publish_left_open_by_a_dead_writer(tmp_path):
+    path = str(tmp_path / "q.live")
+    writer = SharedQTable.create(path, (8, 5))
+    writer.publish(np.ones((8, 5)))
+    writer.generation[0] += 1           # died between the two increments
+    reader = SharedQTable.attach(path)
+
+    started = time.monotonic()
+    table, _ = reader.snapshot()
+    assert time.monotonic() - started < SharedTable.STALL_TIMEOUT + 1.0
+    np.testing.assert_array_equal(table, 1.0)
+    assert reader.stalled is not None
+
+    restarted = SharedQTable.create(path, (8, 5))   # a new trainer closes the publish
+    assert not restarted.generation[0] & 1
+    assert reader.greedy_action(0) == 0
+    restarted.close()
+    reader.close()
+    writer.close()
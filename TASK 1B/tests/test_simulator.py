@@ -0,0 +1,51 @@
+import pytest
+
+from Connector import CoppeliaClient
+from Qlearning import ACTION_SPEEDS
+from Simulator import SimulatorServer
+
+
+@pytest.fixture
+def lockstep_server():
+    server = SimulatorServer(port=0, speedup=0)
+    port = server.start_in_thread()
+    yield port
+    server.shutdown()
+
+
+def drive(port, actions, **client_args):
+    """
+    Send one command per sensor frame, as Train.py does; returns the
+    frames seen (None where none arrived in time).
+    """
+    client = CoppeliaClient(port=port, **client_args)
+    client.connect()
+    frames = [client.wait_for_sensor_data(timeout=1.0)]
+    try:
+        for action in actions:
+            client.send_motor_command(*ACTION_SPEEDS[action], action=action)
+            frames.append(client.wait_for_sensor_data(timeout=0.2))
+    finally:
+        client.close()
+    return frames
+
+
+# =====================================================
+# Lockstep (speedup 0)
+# =====================================================
+def test_lockstep_steps_once_per_command(lockstep_server):
+    frames = drive(lockstep_server, [0] * 50, keepalive=0)
+    assert all(frame is not None for frame in frames)
+
+
+def test_unchanged_commands_stall_lockstep_without_keepalive_0(lockstep_server):
+    frames = drive(lockstep_server, [0] * 3)
+    assert frames[1] is not None and frames[2] is None
+
+
+def test_lockstep_runs_are_reproducible(lockstep_server):
+    actions = [0, 0, 1, 1, 2, 0, 3, 0, 4, 0] * 10
+    first = drive(lockstep_server, actions, keepalive=0)
+    second = drive(lockstep_server, actions, keepalive=0)
+    assert first == second
+    assert len({tuple(frame.values()) for frame in first}) > 1
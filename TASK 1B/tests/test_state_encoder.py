@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from StateEncoder import DEFAULT_STATE_SPEC, StateSpec
+
+
+def five_bit_state(sensors):
+    """
+    The hand-written Get_state the default spec replaces.
+    """
+    bits = [sensors[name] > 0.3 for name in DEFAULT_STATE_SPEC.sensors]
+    return sum(bit << (4 - i) for i, bit in enumerate(bits))
+
+
+def test_default_spec_matches_the_five_bit_state():
+    rng = np.random.default_rng(0)
+    encoder = DEFAULT_STATE_SPEC.compile()
+    readings = rng.random((500, 5))
+    for row in readings:
+        sensors = dict(zip(DEFAULT_STATE_SPEC.sensors, row))
+        assert encoder.encode(sensors) == five_bit_state(sensors)
+    expected = [five_bit_state(dict(zip(DEFAULT_STATE_SPEC.sensors, row))) for row in readings]
+    np.testing.assert_array_equal(encoder.encode_batch(readings), expected)
+
+
+def test_previous_action_is_appended_to_the_state():
+    spec = StateSpec(["left", "right"], prev_action=True, n_actions=5)
+    encoder = spec.compile()
+    assert spec.n_states == 20
+    assert encoder.encode({"left": 1.0, "right": 0.0}, prev_action=3) == 0b10 * 5 + 3
+    assert encoder.sensor_code(0b10 * 5 + 3) == 0b10
+
+
+# =====================================================
+# Hysteresis
+# =====================================================
+def test_hysteresis_keeps_a_bit_inside_the_dead_band():
+    encoder = StateSpec(["middle"], thresholds=0.3, hysteresis=0.1).compile()
+    readings = [0.35, 0.45, 0.35, 0.25, 0.15, 0.25, 0.45]
+    expected = [0, 1, 1, 1, 0, 0, 1]
+    assert [encoder.encode({"middle": v}) for v in readings] == expected
+
+    encoder.reset()
+    batched = [int(encoder.encode_batch(np.array([[v]]))[0]) for v in readings]
+    assert batched == expected
+
+
+def test_batch_hysteresis_is_per_row_and_reset_by_mask():
+    encoder = StateSpec(["middle"], thresholds=0.3, hysteresis=0.1).compile()
+    encoder.encode_batch(np.array([[0.5], [0.5], [0.0]]))
+    np.testing.assert_array_equal(encoder.encode_batch(np.array([[0.35], [0.35], [0.35]])),
+                                  [1, 1, 0])
+    encoder.reset(np.array([False, True, False]))
+    np.testing.assert_array_equal(encoder.encode_batch(np.array([[0.35], [0.35], [0.35]])),
+                                  [1, 0, 0])
+
+
+def test_per_sensor_settings_must_match_the_sensors():
+    with pytest.raises(ValueError):
+        StateSpec(["left", "right"], thresholds=[0.3, 0.3, 0.3])
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from Qlearning import QLearningController
+from Simulator import LineFollowerModel
+from Track import DistanceField, Track
+from VecEnv import VecLineFollowerEnv
+
+
+@pytest.fixture
+def controller():
+    return QLearningController(n_actions=5)
+
+
+# =====================================================
+# Vectorised environment
+# =====================================================
+def test_batched_steps_match_the_simulator_model(controller):
+    env = VecLineFollowerEnv(1, controller, start_offset=0.0, start_heading=0.0,
+                             resolution=None, seed=0)
+    model = LineFollowerModel(env.track)
+    env.reset()
+    assert env.states[0] == controller.Get_state(model.sensors())
+
+    for action in [0, 0, 1, 1, 0, 2, 2, 0, 3, 0, 4, 0] * 5:
+        next_states, rewards, terminated, _ = env.step(np.array([action]))
+        model.step(*controller.perform_action(action), env.dt)
+        if terminated[0]:
+            break
+        assert (env.x[0], env.y[0]) == pytest.approx((model.x, model.y), abs=1e-12)
+        state = controller.Get_state(model.sensors())
+        assert next_states[0] == state
+        assert rewards[0] == controller.Calculate_reward(state)
+
+
+def test_time_limit_truncates_without_terminating(controller):
+    env = VecLineFollowerEnv(8, controller, max_steps=3, start_offset=0.0,
+                             start_heading=0.0, resolution=None, seed=1)
+    env.reset()
+    for step in range(3):
+        _, _, terminated, truncated = env.step(np.zeros(8, dtype=np.int64))
+    assert not terminated.any() and truncated.all()
+    assert (env.steps == 0).all() and env.episodes == 8
+
+
+# =====================================================
+# Distance-field cache
+# =====================================================
+def test_distance_field_matches_the_exact_geometry(tmp_path):
+    track = Track.oval()
+    field = track.distance_field(resolution=0.004, cache_dir=str(tmp_path))
+    rng = np.random.default_rng(2)
+    xs = rng.uniform(-0.6, 0.6, 2000)
+    ys = rng.uniform(-0.4, 0.4, 2000)
+    np.testing.assert_allclose(field.distance_array(xs, ys), track.distance_array(xs, ys),
+                               atol=0.004)
+    for x, y in zip(xs[:50], ys[:50]):
+        assert field.reflectance(x, y) == pytest.approx(field.reflectance_array(x, y), abs=1e-6)
+
+
+def test_distance_field_is_cached_per_track_and_resolution(tmp_path):
+    track = Track.oval()
+    track.distance_field(resolution=0.005, cache_dir=str(tmp_path))
+    (cached,) = tmp_path.iterdir()
+    again = DistanceField.for_track(track, resolution=0.005, cache_dir=str(tmp_path))
+    assert isinstance(again.grid, np.memmap)
+    Track.oval(width=0.7).distance_field(resolution=0.005, cache_dir=str(tmp_path))
+    assert len(list(tmp_path.iterdir())) == 2 and cached.exists()
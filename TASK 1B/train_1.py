@@ -23,13 +23,17 @@
 '''
 '''You can Modify the this file,add more functions According to your usage.
    You are not allowed to add any external packges,Beside the included Packages.You can use Built-in Python modules.'''
-import time
 import signal
 import sys
 
 # Import required modules for communication and Q-learning
+from Checkpoint import CheckpointService
+from Journal import UpdateJournal
+from SharedTable import SharedQTable
 from Connector import CoppeliaClient       
 from Qlearning import QLearningController 
+from Exploration import EpsilonGreedy, Decay
+from StateEncoder import THREE_SENSOR_STATE_SPEC
 
 # Flag to handle graceful shutdown when Ctrl+C is pressed
 stop_requested = False
@@ -46,6 +50,10 @@ def signal_handler(sig, frame):
 # Register the signal handler to handle SIGINT
 signal.signal(signal.SIGINT, signal_handler)
 
+# Run with --lockstep against "python Simulator.py --speedup 0": every
+# command is sent, even an unchanged one, so the simulator steps once per tick
+LOCKSTEP = "--lockstep" in sys.argv
+
 #=== Add Functions Here ===
 
 def main():
@@ -58,23 +66,42 @@ def main():
     global stop_requested
 
     # Q-table & Training Configuration
-    N_STATES = 8        # 0b000 to 0b111
-    N_ACTIONS = 5       # ["forward", "left", "right", "sharp_left", "sharp_right"]
+    N_ACTIONS = 5       # ["forward", "left", "right", "sharp_left", "sharp_right"], as in Train.py
     SAVE_INTERVAL = 100
 
     reward = 0  # initialize reward
 
 
     # === Initialize Q-learning Controller ===
-    ql = QLearningController(n_states=N_STATES, n_actions=N_ACTIONS)
-
-    # Load existing Q-table if it exists (resumes training from last session)
-    ql.load_q_table()
+    # N_STATES follows from the state spec (8 for the three-sensor layout of
+    # the shipped q_table.pkl, shared with Train.py and the test scripts)
+    ql = QLearningController(n_actions=N_ACTIONS, state_spec=THREE_SENSOR_STATE_SPEC)
+    # Epsilon decays with how often each state has been visited, so states
+    # reached late in training are still explored
+    ql.exploration = EpsilonGreedy(Decay(ql.epsilon, 0.05, half_life=140), clock="visits")
+
+    # Journal every Q-update so a crash loses at most ~1 s of training
+    ql.journal = UpdateJournal(ql.filename + ".journal")
+
+    # Load existing Q-table if it exists (resumes training from last session);
+    # journalled updates made after the last checkpoint are replayed on top
+    try:
+        ql.load_q_table()
+    except ValueError as e:
+        print(f"[TRAIN] Cannot resume from {ql.filename}: {e}")
+        print("[TRAIN] Move it away to start a fresh Q-table. Exiting.")
+        return
+    saver = CheckpointService(ql)  # Writes checkpoints off the control loop
+
+    # Publish the Q-table for live evaluation (Test.py --live)
+    live = SharedQTable.create(ql.filename + ".live", ql.q_table.shape)
+    live.publish(ql.q_table)
 
     # === Connect to the CoppeliaSim simulator ===
-    client = CoppeliaClient()
+    client = CoppeliaClient(keepalive=0) if LOCKSTEP else CoppeliaClient()
     print("[DEBUG] Attempting to connect to wrapper...")
     client.connect()
+    client.preencode_motor_commands(ql.perform_action(a) for a in range(ql.n_actions))
     print("[DEBUG] Connected successfully!")
 
 
@@ -91,11 +118,12 @@ def main():
     # === Training Loop Starts Here ===
     while not stop_requested:
         #  Read sensor data from simulator
-        sensor_data = client.receive_sensor_data()
+        sensor_data, skipped = client.wait_for_latest_sensor_data()
         print(sensor_data)  # Optional: Log raw sensor input
+        if skipped:
+            print(f"[TRAIN] Skipped {skipped} stale sensor frame(s)")
         if not sensor_data:
-            time.sleep(0.05)
-            continue  # Skip iteration if sensor data is invalid
+            continue  # No frame arrived before the timeout
 
         # Convert sensor data to a discrete state
         state = ql.Get_state(sensor_data)
@@ -117,21 +145,25 @@ def main():
         prev_state = state
         prev_action = action
 
+        live.publish(ql.q_table)  # Readers see the updated policy right away
         iteration += 1  # Increment training step count
-        ql.epsilon = max(0.05, ql.epsilon * 0.995)
         # Save Q-table periodically
         if iteration % SAVE_INTERVAL == 0:
-            ql.save_q_table()
-            print(f"[TRAIN] Saved Q-table at iteration {iteration}")
-
-        # Control loop timing 
-        time.sleep(0.05)
+            saver.save()  # Snapshot only; the file is written in the background
+            print(f"[TRAIN] Queued Q-table save at iteration {iteration}")
 
     # === When training is interrupted (Ctrl+C) ===
-    ql.save_q_table()  # Save final Q-table before exiting
-    client.send_motor_command(0, 0)  # Stop the robot
+    saver.save()   # Save final Q-table before exiting
+    saved = saver.close()  # Wait until it is on disk
+    ql.journal.close()
+    live.close()
+    client.send_motor_command(0, 0, force=True)  # Stop the robot
     client.close()  # Disconnect from simulator
-    print("[TRAIN] Training stopped and Q-table saved.")
+    if saved:
+        print("[TRAIN] Training stopped and Q-table saved.")
+    else:
+        # The journal keeps the updates, the next run replays them
+        print(f"[TRAIN] Training stopped, but saving the Q-table failed: {saver.last_error}")
 
 
 # Script entry point